@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import configparser
+import json
+import logging
+import resource
+import time
+from pathlib import Path
+
+import multi_async
+from mock import MockGame, MockServer
+from utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+def peak_rss_kb() -> int:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def set_benchmark_config(
+    config: configparser.ConfigParser,
+    port: int,
+    agent_num: int,
+    rounds: int,
+    backend: str,
+) -> None:
+    config.set("websocket", "url", f"ws://127.0.0.1:{port}/ws")
+    config.set("connection", "keep_connection", "false")
+    config.set("game", "num", str(rounds))
+    config.set("agent", "num", str(agent_num))
+    for i in range(agent_num):
+        config.set("agent", f"name{i + 1}", f"bench{i + 1}")
+    config.set("model", "backend", backend)
+
+
+async def run_benchmark(  # noqa: PLR0913
+    config: configparser.ConfigParser,
+    games: int,
+    rounds: int,
+    port: int,
+    seed: int | None,
+    talk_turn: int,
+    action_timeout: float,
+    backend: str = "mock",
+) -> dict:
+    agent_num = games * len(MockGame.default_roles)
+    set_benchmark_config(
+        config=config,
+        port=port,
+        agent_num=agent_num,
+        rounds=rounds,
+        backend=backend,
+    )
+
+    server = MockServer(
+        port=port,
+        game_num=games * rounds,
+        seed=seed,
+        max_talk_turn=talk_turn,
+        action_timeout=action_timeout,
+        response_timeout=action_timeout * 2,
+    )
+    await server.start()
+
+    base_rss = peak_rss_kb()
+    start = time.monotonic()
+    try:
+        await multi_async.main(config=config)
+    finally:
+        await server.close()
+    elapsed = time.monotonic() - start
+
+    summary = server.stats.summary()
+    summary["agents"] = agent_num
+    summary["elapsed"] = elapsed
+    summary["games_per_minute"] = server.stats.game_num / elapsed * 60 if elapsed > 0 else 0.0
+    summary["memory_per_agent_mb"] = (peak_rss_kb() - base_rss) / agent_num / 1024
+    summary["agent_metrics"] = Metrics.summary()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="モックサーバとモックLLMを使用したベンチマーク")
+    parser.add_argument("--config", default="./src/res/config.ini")
+    parser.add_argument("--games", type=int, default=4, help="同時に実行するゲーム数")
+    parser.add_argument("--rounds", type=int, default=1, help="各エージェントが続けて行うゲーム数")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--talk-turn", type=int, default=3)
+    parser.add_argument("--action-timeout", type=float, default=10)
+    parser.add_argument("--backend", default="mock", help="使用する生成AIのバックエンド")
+    parser.add_argument("--output", default=None, help="結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    if Path(args.config).exists():
+        config = configparser.ConfigParser()
+        config.read(args.config)
+        logger.info("設定ファイルを読み込みました")
+    else:
+        raise FileNotFoundError(args.config, "設定ファイルが見つかりません")
+
+    summary = asyncio.run(
+        run_benchmark(
+            config=config,
+            games=args.games,
+            rounds=args.rounds,
+            port=args.port,
+            seed=args.seed,
+            talk_turn=args.talk_turn,
+            action_timeout=args.action_timeout,
+            backend=args.backend,
+        ),
+    )
+    logger.info(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(summary, ensure_ascii=False, indent=2))
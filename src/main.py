@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import configparser
 import logging
+import multiprocessing
 from pathlib import Path
 from typing import TYPE_CHECKING
 
@@ -20,6 +21,16 @@ from aiwolf_nlp_common.client.websocket import WebSocketClient
 
 import player
 import utils
+from res.prompt import Prompt
+from utils.action_executor import ActionExecutor
+from utils.llm.backend import BackendRegistry
+from utils.llm.client_pool import ClientPool
+from utils.llm.event_loop import EventLoop
+from utils.llm.gateway import RequestGateway
+from utils.llm.response_cache import ResponseCache
+from utils.log import LogWriter
+from utils.metrics import Metrics
+from utils.session_log import SessionRecorder
 
 logger = logging.getLogger(__name__)
 handler = logging.StreamHandler()
@@ -29,6 +40,83 @@ logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
 
+# seconds to wait before connecting to the game server again
+reconnect_interval = 15
+
+
+def log_connect_error(name: str, ex: Exception) -> None:
+    logger.warning("エージェント %s がゲームサーバに接続できませんでした", name)
+    logger.warning(ex)
+    logger.info("再接続を試みます")
+
+
+def create_agent(
+    idx: int,
+    config: ConfigParser,
+    log_info: LogInfo,
+) -> tuple[player.agent.Agent, SessionRecorder | None]:
+    name = config.get("agent", f"name{idx}")
+    agent = player.agent.Agent(
+        name=name,
+        agent_log=AgentLog(config=config, agent_name=name, log_info=log_info),
+    )
+    return agent, SessionRecorder.from_config(config=config, agent_name=name)
+
+
+def receive_packets(
+    agent: player.agent.Agent,
+    receive: str | list[str] | None,
+    recorder: SessionRecorder | None,
+) -> None:
+    if isinstance(receive, (str, list)):
+        if recorder is not None:
+            recorder.record_received(texts=receive)
+        agent.append_recv(recv=receive)
+
+
+def finish_action(
+    agent: player.agent.Agent,
+    req: str,
+    recorder: SessionRecorder | None,
+) -> tuple[player.agent.Agent, str]:
+    # returns the agent for the next packet and the response to send ("" for none)
+    if agent.packet is None:
+        return agent, ""
+    if Action.is_initialize(request=agent.packet.request):
+        agent = utils.agent_util.set_role(prev_agent=agent)
+    if req != "" and recorder is not None:
+        recorder.record_sent(text=req)
+    return agent, req
+
+
+def close_agent(agent: player.agent.Agent, recorder: SessionRecorder | None) -> None:
+    if recorder is not None:
+        recorder.close()
+    logger.info("エージェント %s とゲームサーバの接続を切断しました", agent.name)
+
+
+def setup(config: ConfigParser, idx: int | None = None) -> None:
+    # process-wide services; every runner starts them here and stops them with teardown
+    Metrics.configure(config=config, idx=idx)
+    Prompt.configure(config=config)
+    ResponseCache.configure(config=config)
+    RequestGateway.configure(config=config)
+    BackendRegistry.preload(config=config)
+
+
+async def ateardown() -> None:
+    await ClientPool.aclose()
+    ResponseCache.close()
+    ActionExecutor.shutdown()
+    # processes started by multi.py exit without running atexit handlers
+    LogWriter.stop()
+    Metrics.close()
+
+
+def teardown() -> None:
+    EventLoop.run(ateardown())
+
+
 def run_agent(
     idx: int,
     config: ConfigParser,
@@ -44,31 +132,21 @@ def run_agent(
             logger.info("エージェント %s がゲームサーバに接続しました", name)
             break
         except Exception as ex:  # noqa: BLE001
-            logger.warning("エージェント %s がゲームサーバに接続できませんでした", name)
-            logger.warning(ex)
-            logger.info("再接続を試みます")
-            sleep(15)
+            log_connect_error(name=name, ex=ex)
+            sleep(reconnect_interval)
 
-    agent = player.agent.Agent(
-        name=name,
-        agent_log=AgentLog(config=config, agent_name=name, log_info=log_info),
-    )
+    agent, recorder = create_agent(idx=idx, config=config, log_info=log_info)
     while agent.running:
         if len(agent.received) == 0:
-            receive = client.receive()
-            if isinstance(receive, (str, list)):
-                agent.append_recv(recv=receive)
+            receive_packets(agent=agent, receive=client.receive(), recorder=recorder)
         agent.set_packet()
         req = agent.action(config=config)
-        if agent.packet is None:
-            continue
-        if Action.is_initialize(request=agent.packet.request):
-            agent = utils.agent_util.set_role(prev_agent=agent)
+        agent, req = finish_action(agent=agent, req=req, recorder=recorder)
         if req != "":
             client.send(req=req)
 
     client.close()
-    logger.info("エージェント %s とゲームサーバの接続を切断しました", name)
+    close_agent(agent=agent, recorder=recorder)
 
 
 def execute(
@@ -76,6 +154,10 @@ def execute(
     config: ConfigParser,
     log_info: LogInfo,
 ) -> None:
+    # processes started by multi.py each get their own metrics file and port
+    is_child = multiprocessing.parent_process() is not None
+    setup(config=config, idx=idx if is_child else None)
+
     while True:
         for _ in range(config.getint("game", "num")):
             run_agent(
@@ -87,6 +169,8 @@ def execute(
         if not config.getboolean("connection", "keep_connection"):
             break
 
+    teardown()
+
 
 if __name__ == "__main__":
     config_path = "./src/res/config.ini"
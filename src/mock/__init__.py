@@ -0,0 +1,2 @@
+from .game import MockGame, MockPlayer, RequestStats
+from .server import MockServer
@@ -0,0 +1,381 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING
+
+from aiwolf_nlp_common import Action, Status
+from aiwolf_nlp_common.role import RoleInfo
+
+if TYPE_CHECKING:
+    from websockets.asyncio.server import ServerConnection
+
+
+class RequestStats:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.timeout_nums: Counter[str] = Counter()
+        self.no_response_nums: Counter[str] = Counter()
+        self.game_num: int = 0
+        self.winners: Counter[str] = Counter()
+
+    def record(self, request: str, latency: float, *, timed_out: bool) -> None:
+        self.latencies[request].append(latency)
+        if timed_out:
+            self.timeout_nums[request] += 1
+
+    def percentile(self, request: str, q: float) -> float:
+        latencies = sorted(self.latencies[request])
+        if len(latencies) == 0:
+            return 0.0
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    def request_num(self) -> int:
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    def timeout_rate(self) -> float:
+        request_num = self.request_num()
+        if request_num == 0:
+            return 0.0
+        return sum(self.timeout_nums.values()) / request_num
+
+    def summary(self) -> dict:
+        return {
+            "games": self.game_num,
+            "winners": dict(self.winners),
+            "requests": self.request_num(),
+            "timeout_rate": self.timeout_rate(),
+            "no_response": dict(self.no_response_nums),
+            "latency": {
+                request: {
+                    "count": len(latencies),
+                    "p50": self.percentile(request, 0.5),
+                    "p90": self.percentile(request, 0.9),
+                    "p99": self.percentile(request, 0.99),
+                    "max": max(latencies),
+                }
+                for request, latencies in sorted(self.latencies.items())
+            },
+        }
+
+
+class MockPlayer:
+    def __init__(self, websocket: ServerConnection) -> None:
+        self.websocket = websocket
+        self.name: str = ""
+        self.agent: str = ""
+        self.role: str = RoleInfo.VILLAGER.value.en
+        self.alive: bool = True
+        self.stale_num: int = 0
+
+    async def send(self, packet: dict) -> None:
+        await self.websocket.send(json.dumps(packet, ensure_ascii=False))
+
+    async def request(
+        self,
+        packet: dict,
+        timeout: float,
+        stats: RequestStats,
+        action_timeout: float,
+    ) -> str | None:
+        start = time.monotonic()
+        await self.send(packet=packet)
+        try:
+            async with asyncio.timeout(timeout):
+                # skip answers to earlier requests that arrived after they had timed out
+                while True:
+                    response = await self.websocket.recv()
+                    if self.stale_num == 0:
+                        break
+                    self.stale_num -= 1
+        except TimeoutError:
+            self.stale_num += 1
+            stats.no_response_nums[packet["request"]] += 1
+            stats.record(packet["request"], time.monotonic() - start, timed_out=True)
+            return None
+
+        latency = time.monotonic() - start
+        stats.record(packet["request"], latency, timed_out=latency > action_timeout)
+        if isinstance(response, bytes):
+            response = response.decode("utf-8")
+        return response.strip()
+
+
+class MockGame:
+    default_roles = (
+        RoleInfo.VILLAGER.value.en,
+        RoleInfo.VILLAGER.value.en,
+        RoleInfo.SEER.value.en,
+        RoleInfo.WEREWOLF.value.en,
+        RoleInfo.POSSESSED.value.en,
+    )
+
+    def __init__(  # noqa: PLR0913
+        self,
+        players: list[MockPlayer],
+        stats: RequestStats,
+        seed: int | None = None,
+        max_talk_turn: int = 3,
+        action_timeout: float = 60,
+        response_timeout: float = 120,
+        *,
+        talk_on_first_day: bool = False,
+    ) -> None:
+        self.players = players
+        self.stats = stats
+        self.random = random.Random(seed)  # noqa: S311
+        self.max_talk_turn = max_talk_turn
+        self.action_timeout = action_timeout
+        self.response_timeout = response_timeout
+        self.talk_on_first_day = talk_on_first_day
+
+        # sortable by start time like the IDs of the real server
+        self.game_id = (
+            datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")  # noqa: DTZ005
+            + "-"
+            + uuid.uuid4().hex[:8]
+        )
+        self.day: int = 0
+        self.talks: list[dict] = []
+        self.whispers: list[dict] = []
+        self.talk_sent: dict[str, int] = {}
+        self.whisper_sent: dict[str, int] = {}
+        self.votes: list[dict] = []
+        self.executed: str | None = None
+        self.attacked: str | None = None
+        self.divine_result: dict | None = None
+
+        roles = list(MockGame.default_roles)
+        self.random.shuffle(roles)
+        for i, (player, role) in enumerate(zip(players, roles, strict=True)):
+            player.agent = f"Agent[{i + 1:0>2d}]"
+            player.role = role
+            player.alive = True
+
+    def setting(self) -> dict:
+        return {
+            "roleNumMap": dict(Counter(player.role for player in self.players)),
+            "maxTalk": self.max_talk_turn,
+            "maxTalkTurn": self.max_talk_turn,
+            "maxWhisper": self.max_talk_turn,
+            "maxWhisperTurn": self.max_talk_turn,
+            "maxSkip": self.max_talk_turn,
+            "isEnableNoAttack": False,
+            "isVoteVisible": True,
+            "isTalkOnFirstDay": self.talk_on_first_day,
+            "responseTimeout": int(self.response_timeout * 1000),
+            "actionTimeout": int(self.action_timeout * 1000),
+            "maxRevote": 1,
+            "maxAttackRevote": 1,
+            "playerNum": len(self.players),
+        }
+
+    def info(self, player: MockPlayer, *, reveal: bool = False) -> dict:
+        if reveal:
+            role_map = {p.agent: p.role for p in self.players}
+        elif RoleInfo.is_werewolf(role=player.role):
+            role_map = {
+                p.agent: p.role for p in self.players if RoleInfo.is_werewolf(role=p.role)
+            }
+        else:
+            role_map = {player.agent: player.role}
+
+        return {
+            "gameID": self.game_id,
+            "day": self.day,
+            "agent": player.agent,
+            "mediumResult": None,
+            "divineResult": self.divine_result if RoleInfo.is_seer(role=player.role) else None,
+            "executedAgent": self.executed,
+            "attackedAgent": self.attacked,
+            "voteList": self.votes,
+            "attackVoteList": [],
+            "statusMap": {
+                p.agent: Status.ALIVE.value if p.alive else Status.DEAD.value
+                for p in self.players
+            },
+            "roleMap": role_map,
+        }
+
+    def packet(self, request: Action, player: MockPlayer, **kwargs: object) -> dict:
+        packet = {"request": request.value, "info": self.info(player=player)}
+        packet.update(kwargs)
+        return packet
+
+    def alive_players(self) -> list[MockPlayer]:
+        return [player for player in self.players if player.alive]
+
+    def alive_werewolves(self) -> list[MockPlayer]:
+        return [
+            player for player in self.alive_players() if RoleInfo.is_werewolf(role=player.role)
+        ]
+
+    def winner(self) -> str | None:
+        werewolf_num = len(self.alive_werewolves())
+        if werewolf_num == 0:
+            return RoleInfo.VILLAGER.value.team.en
+        if werewolf_num >= len(self.alive_players()) - werewolf_num:
+            return RoleInfo.WEREWOLF.value.team.en
+        return None
+
+    def pick_target(self, response: str | None, candidates: list[MockPlayer]) -> MockPlayer:
+        for candidate in candidates:
+            if response is not None and candidate.agent == response:
+                return candidate
+        return self.random.choice(candidates)
+
+    async def request(self, player: MockPlayer, packet: dict) -> str | None:
+        return await player.request(
+            packet=packet,
+            timeout=self.response_timeout,
+            stats=self.stats,
+            action_timeout=self.action_timeout,
+        )
+
+    async def broadcast(self, request: Action, **kwargs: object) -> None:
+        for player in self.players:
+            packet = self.packet(request=request, player=player, **kwargs)
+            if request == Action.DAILY_FINISH:
+                packet["talkHistory"] = self.unsent(self.talks, self.talk_sent, player)
+            await player.send(packet=packet)
+
+    @staticmethod
+    def unsent(history: list[dict], sent: dict[str, int], player: MockPlayer) -> list[dict]:
+        start = sent.get(player.agent, 0)
+        sent[player.agent] = len(history)
+        return history[start:]
+
+    async def talk_rounds(
+        self,
+        request: Action,
+        players: list[MockPlayer],
+        history: list[dict],
+        sent: dict[str, int],
+    ) -> None:
+        history_key = "talkHistory" if request == Action.TALK else "whisperHistory"
+        for turn in range(self.max_talk_turn):
+            for player in players:
+                packet = self.packet(request=request, player=player)
+                packet[history_key] = self.unsent(history, sent, player)
+                text = await self.request(player=player, packet=packet)
+                history.append(
+                    {
+                        "agent": player.agent,
+                        "day": self.day,
+                        "idx": len(history),
+                        "text": text if text else "Skip",
+                        "turn": turn,
+                        "skip": not text,
+                        "over": text == "Over",
+                    },
+                )
+
+    async def vote(self) -> MockPlayer:
+        alive = self.alive_players()
+        responses = await asyncio.gather(
+            *(
+                self.request(player=player, packet=self.packet(request=Action.VOTE, player=player))
+                for player in alive
+            ),
+        )
+        self.votes = []
+        for player, response in zip(alive, responses, strict=True):
+            target = self.pick_target(
+                response=response,
+                candidates=[p for p in alive if p is not player],
+            )
+            self.votes.append({"agent": player.agent, "day": self.day, "target": target.agent})
+
+        counts = Counter(vote["target"] for vote in self.votes)
+        top = max(counts.values())
+        executed = self.random.choice(sorted(agent for agent, n in counts.items() if n == top))
+        return next(player for player in alive if player.agent == executed)
+
+    async def divine(self) -> None:
+        for seer in self.alive_players():
+            if not RoleInfo.is_seer(role=seer.role):
+                continue
+            response = await self.request(
+                player=seer,
+                packet=self.packet(request=Action.DIVINE, player=seer),
+            )
+            target = self.pick_target(
+                response=response,
+                candidates=[p for p in self.alive_players() if p is not seer],
+            )
+            self.divine_result = {
+                "day": self.day,
+                "agent": seer.agent,
+                "target": target.agent,
+                "result": "WEREWOLF" if RoleInfo.is_werewolf(role=target.role) else "HUMAN",
+            }
+
+    async def attack(self) -> MockPlayer | None:
+        werewolves = self.alive_werewolves()
+        if len(werewolves) == 0:
+            return None
+        if len(werewolves) > 1:
+            await self.talk_rounds(Action.WHISPER, werewolves, self.whispers, self.whisper_sent)
+
+        candidates = [p for p in self.alive_players() if p not in werewolves]
+        response = await self.request(
+            player=werewolves[0],
+            packet=self.packet(request=Action.ATTACK, player=werewolves[0]),
+        )
+        return self.pick_target(response=response, candidates=candidates)
+
+    async def run(self) -> str:
+        for player in self.players:
+            await player.send(
+                packet=self.packet(
+                    request=Action.INITIALIZE,
+                    player=player,
+                    setting=self.setting(),
+                ),
+            )
+
+        winner = None
+        while winner is None:
+            self.talks = []
+            self.talk_sent = {}
+            await self.broadcast(Action.DAILY_INITIALIZE, setting=self.setting())
+            if self.day > 0 or self.talk_on_first_day:
+                await self.talk_rounds(
+                    Action.TALK,
+                    self.alive_players(),
+                    self.talks,
+                    self.talk_sent,
+                )
+            await self.broadcast(Action.DAILY_FINISH)
+
+            self.executed = None
+            self.attacked = None
+            if self.day > 0:
+                executed = await self.vote()
+                executed.alive = False
+                self.executed = executed.agent
+                winner = self.winner()
+                if winner is not None:
+                    break
+
+            await self.divine()
+            if self.day > 0:
+                attacked = await self.attack()
+                if attacked is not None:
+                    attacked.alive = False
+                    self.attacked = attacked.agent
+                winner = self.winner()
+            self.day += 1
+
+        for player in self.players:
+            await player.send(
+                packet={"request": Action.FINISH.value, "info": self.info(player, reveal=True)},
+            )
+        self.stats.game_num += 1
+        self.stats.winners[winner] += 1
+        return winner
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+import websockets
+from aiwolf_nlp_common import Action
+from websockets.exceptions import ConnectionClosed
+
+from mock.game import MockGame, MockPlayer, RequestStats
+
+if TYPE_CHECKING:
+    from websockets.asyncio.server import Server, ServerConnection
+
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+class MockServer:
+    def __init__(  # noqa: PLR0913
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        game_num: int = 0,
+        seed: int | None = None,
+        max_talk_turn: int = 3,
+        action_timeout: float = 60,
+        response_timeout: float = 120,
+        *,
+        talk_on_first_day: bool = False,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.game_num = game_num
+        self.seed = seed
+        self.max_talk_turn = max_talk_turn
+        self.action_timeout = action_timeout
+        self.response_timeout = response_timeout
+        self.talk_on_first_day = talk_on_first_day
+
+        self.player_num = len(MockGame.default_roles)
+        self.stats = RequestStats()
+        self.waiting: list[tuple[MockPlayer, asyncio.Future]] = []
+        self.started_num: int = 0
+        self.games: set[asyncio.Task] = set()
+        self.server: Server | None = None
+        self.finished = asyncio.Event()
+
+    async def start(self) -> None:
+        self.server = await websockets.serve(
+            self.handle,
+            self.host,
+            self.port,
+            ping_interval=None,
+            max_size=None,
+        )
+        logger.info("モックサーバを起動しました ws://%s:%d/ws", self.host, self.port)
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def serve(self) -> None:
+        await self.start()
+        try:
+            await self.finished.wait()
+        finally:
+            await self.close()
+
+    async def handle(self, websocket: ServerConnection) -> None:
+        player = MockPlayer(websocket=websocket)
+        try:
+            name = await player.request(
+                packet={"request": Action.NAME.value},
+                timeout=self.response_timeout,
+                stats=self.stats,
+                action_timeout=self.action_timeout,
+            )
+        except ConnectionClosed:
+            return
+        player.name = name or ""
+
+        done = asyncio.get_running_loop().create_future()
+        self.waiting.append((player, done))
+        if len(self.waiting) >= self.player_num:
+            entries = self.waiting[: self.player_num]
+            del self.waiting[: self.player_num]
+            task = asyncio.create_task(self.play(entries=entries))
+            self.games.add(task)
+            task.add_done_callback(self.games.discard)
+
+        # the connection is closed as soon as this handler returns
+        await done
+
+    async def play(self, entries: list[tuple[MockPlayer, asyncio.Future]]) -> None:
+        seed = self.seed + self.started_num if self.seed is not None else None
+        self.started_num += 1
+        game = MockGame(
+            players=[player for player, _ in entries],
+            stats=self.stats,
+            seed=seed,
+            max_talk_turn=self.max_talk_turn,
+            action_timeout=self.action_timeout,
+            response_timeout=self.response_timeout,
+            talk_on_first_day=self.talk_on_first_day,
+        )
+        try:
+            winner = await game.run()
+            logger.info(
+                "ゲーム %d が終了しました 勝利陣営: %s",
+                self.stats.game_num,
+                winner,
+            )
+        except ConnectionClosed as ex:
+            logger.warning("ゲーム中にエージェントとの接続が切断されました")
+            logger.warning(ex)
+        finally:
+            for _, done in entries:
+                if not done.done():
+                    done.set_result(None)
+            if 0 < self.game_num <= self.stats.game_num:
+                self.finished.set()
+
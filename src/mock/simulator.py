@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import importlib
+import time
+from typing import Callable
+
+import numpy as np
+from aiwolf_nlp_common import Action
+from aiwolf_nlp_common.role import RoleInfo
+
+from mock.game import MockGame
+from utils.game_state import target_scores
+
+Policy = Callable[["Simulator", str, np.ndarray, np.ndarray], np.ndarray]
+
+VILLAGE = 1
+WEREWOLF = 2
+# divine results the seer of each game has seen, per target
+UNKNOWN = 0
+HUMAN = 1
+BLACK = 2
+
+
+def choose_best(scores: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    # rows without a candidate pick index 0; callers only apply rows that have one
+    return np.where(candidates, scores, -np.inf).argmax(axis=1)
+
+
+def random_policy(
+    sim: Simulator,
+    request: str,  # noqa: ARG001
+    actors: np.ndarray,  # noqa: ARG001
+    candidates: np.ndarray,
+) -> np.ndarray:
+    return choose_best(scores=sim.rng.random(candidates.shape), candidates=candidates)
+
+
+def suspicion_policy(
+    sim: Simulator,
+    request: str,
+    actors: np.ndarray,
+    candidates: np.ndarray,
+) -> np.ndarray:
+    # the same ranking as GameState.choose, over every game of the batch at once
+    # only a seer knows its divine results
+    known = (actors == sim.seer)[:, None] & (sim.divined == BLACK)
+    scores = target_scores(
+        request=request,
+        suspicion=sim.suspicion,
+        claims=sim.claims,
+        known=known.astype(np.float64),
+    )
+    # ties go to a random candidate, as random.choice does in GameState.choose
+    noise = sim.rng.random(candidates.shape) * 0.5
+    return choose_best(scores=scores + noise, candidates=candidates)
+
+
+class Simulator:
+    policies: dict[str, str | Policy] = {  # noqa: RUF012
+        "random": random_policy,
+        "suspicion": suspicion_policy,
+    }
+
+    def __init__(  # noqa: PLR0913
+        self,
+        games: int,
+        policy: str = "suspicion",
+        role_policies: dict[str, str] | None = None,
+        roles: tuple[str, ...] = MockGame.default_roles,
+        seed: int | None = None,
+        fake_claim: float = 0.5,
+        max_days: int = 20,
+    ) -> None:
+        self.games = games
+        self.role_names = sorted(set(roles))
+        self.fake_claim = fake_claim
+        self.max_days = max_days
+        self.rng = np.random.default_rng(seed)
+
+        # role of every agent in every game, as an index into role_names
+        codes = np.array([self.role_names.index(role) for role in roles], dtype=np.int8)
+        order = self.rng.random((games, len(roles))).argsort(axis=1)
+        self.roles = codes[order]
+        self.teams = np.array(
+            [
+                WEREWOLF
+                if RoleInfo.get_role_info(role=role).team.en == RoleInfo.WEREWOLF.value.team.en
+                else VILLAGE
+                for role in self.role_names
+            ],
+            dtype=np.int8,
+        )
+        self.werewolf = np.isin(
+            self.roles,
+            [i for i, role in enumerate(self.role_names) if RoleInfo.is_werewolf(role=role)],
+        )
+        is_seer = np.isin(
+            self.roles,
+            [i for i, role in enumerate(self.role_names) if RoleInfo.is_seer(role=role)],
+        )
+        self.seer = np.where(is_seer.any(axis=1), is_seer.argmax(axis=1), -1)
+
+        self.alive = np.ones(self.roles.shape, dtype=bool)
+        self.suspicion = np.zeros(self.roles.shape, dtype=np.float32)
+        self.claims = np.zeros(self.roles.shape, dtype=np.int16)
+        self.divined = np.zeros(self.roles.shape, dtype=np.int8)
+        self.last_divined = np.full(games, -1)
+        self.winner = np.zeros(games, dtype=np.int8)
+        self.days = np.zeros(games, dtype=np.int16)
+        self.rows = np.arange(games)
+
+        # role name -> policy; one policy may serve several roles
+        role_policies = role_policies or {}
+        self.groups: list[tuple[Policy, list[int]]] = []
+        for name in {role_policies.get(role, policy) for role in self.role_names}:
+            codes_for = [
+                i
+                for i, role in enumerate(self.role_names)
+                if role_policies.get(role, policy) == name
+            ]
+            self.groups.append((self.get_policy(name=name), codes_for))
+
+    @classmethod
+    def get_policy(cls, name: str) -> Policy:
+        policy = cls.policies.get(name, name)
+        if not isinstance(policy, str):
+            return policy
+        # an unknown name may itself be a "module:function" target
+        module_name, _, attribute = policy.partition(":")
+        if not attribute:
+            raise ValueError(name, f"登録されていない方針です: {', '.join(sorted(cls.policies))}")
+        return getattr(importlib.import_module(module_name), attribute)
+
+    def decide(self, request: str, actors: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        targets = np.zeros(self.games, dtype=np.int64)
+        actor_roles = self.roles[self.rows, actors]
+        for policy, codes in self.groups:
+            rows = np.isin(actor_roles, codes)
+            if rows.any():
+                targets[rows] = policy(self, request, actors, candidates)[rows]
+        return targets
+
+    def talk(self, active: np.ndarray) -> None:
+        # stub talk: the seer reports its last result and the werewolf side may claim seer too
+        seer_rows = active & (self.seer >= 0) & (self.last_divined >= 0)
+        seer_rows &= self.alive[self.rows, np.maximum(self.seer, 0)]
+        target = np.maximum(self.last_divined, 0)
+        black = seer_rows & (self.divined[self.rows, target] == BLACK)
+        self.claims[self.rows[seer_rows], self.seer[seer_rows]] += 1
+        self.suspicion[self.rows[black], target[black]] += 1
+
+        liars = active[:, None] & self.alive & (self.teams[self.roles] == WEREWOLF)
+        liars &= self.rng.random(self.roles.shape) < self.fake_claim
+        for agent in range(self.roles.shape[1]):
+            rows = liars[:, agent]
+            if not rows.any():
+                continue
+            self.claims[rows, agent] += 1
+            candidates = self.alive & ~self.werewolf
+            candidates[:, agent] = False
+            accused = choose_best(scores=self.rng.random(self.roles.shape), candidates=candidates)
+            rows &= candidates.any(axis=1)
+            self.suspicion[self.rows[rows], accused[rows]] += 1
+
+    def vote(self, active: np.ndarray) -> None:
+        counts = np.zeros(self.roles.shape, dtype=np.int16)
+        for agent in range(self.roles.shape[1]):
+            rows = active & self.alive[:, agent]
+            candidates = self.alive.copy()
+            candidates[:, agent] = False
+            rows &= candidates.any(axis=1)
+            if not rows.any():
+                continue
+            actors = np.full(self.games, agent)
+            targets = self.decide(request=Action.VOTE.value, actors=actors, candidates=candidates)
+            np.add.at(counts, (self.rows[rows], targets[rows]), 1)
+        scores = counts + self.rng.random(self.roles.shape) * 0.5
+        executed = choose_best(scores=scores, candidates=self.alive)
+        self.alive[self.rows[active], executed[active]] = False
+
+    def divine(self, active: np.ndarray) -> None:
+        seer = np.maximum(self.seer, 0)
+        rows = active & (self.seer >= 0) & self.alive[self.rows, seer]
+        candidates = self.alive & (self.divined == UNKNOWN)
+        candidates[self.rows, seer] = False
+        rows &= candidates.any(axis=1)
+        if not rows.any():
+            return
+        targets = self.decide(request=Action.DIVINE.value, actors=seer, candidates=candidates)
+        results = np.where(self.werewolf[self.rows, targets], BLACK, HUMAN).astype(np.int8)
+        self.divined[self.rows[rows], targets[rows]] = results[rows]
+        self.last_divined = np.where(rows, targets, self.last_divined)
+
+    def attack(self, active: np.ndarray) -> None:
+        wolves = self.alive & self.werewolf
+        candidates = self.alive & ~self.werewolf
+        rows = active & wolves.any(axis=1) & candidates.any(axis=1)
+        if not rows.any():
+            return
+        attackers = wolves.argmax(axis=1)
+        targets = self.decide(request=Action.ATTACK.value, actors=attackers, candidates=candidates)
+        self.alive[self.rows[rows], targets[rows]] = False
+
+    def judge(self, active: np.ndarray) -> None:
+        wolves = (self.alive & self.werewolf).sum(axis=1)
+        humans = self.alive.sum(axis=1) - wolves
+        winner = np.where(wolves == 0, VILLAGE, np.where(wolves >= humans, WEREWOLF, 0))
+        self.winner = np.where(active, winner, self.winner).astype(np.int8)
+
+    def run(self) -> dict:
+        # follows MockGame.run: no vote or attack on day 0, and a winner is checked after each
+        start = time.perf_counter()
+        for day in range(self.max_days):
+            active = self.winner == 0
+            if not active.any():
+                break
+            self.days[active] = day
+            if day > 0:
+                self.talk(active=active)
+                self.vote(active=active)
+                self.judge(active=active)
+                active &= self.winner == 0
+            self.divine(active=active)
+            if day > 0:
+                self.attack(active=active)
+                self.judge(active=active)
+        elapsed = time.perf_counter() - start
+        return self.summary(elapsed=elapsed)
+
+    def summary(self, elapsed: float) -> dict:
+        finished = self.winner != 0
+        won = self.teams[self.roles] == self.winner[:, None]
+        win_rates = {}
+        for i, role in enumerate(self.role_names):
+            mask = (self.roles == i) & finished[:, None]
+            win_rates[role] = float(won[mask].mean()) if mask.any() else 0.0
+        return {
+            "games": self.games,
+            "unfinished": int((~finished).sum()),
+            "elapsed": elapsed,
+            "games_per_second": self.games / elapsed if elapsed > 0 else 0.0,
+            "average_days": float(self.days[finished].mean()) if finished.any() else 0.0,
+            "team_win_rates": {
+                RoleInfo.VILLAGER.value.team.en: float((self.winner == VILLAGE).mean()),
+                RoleInfo.WEREWOLF.value.team.en: float((self.winner == WEREWOLF).mean()),
+            },
+            "win_rates": win_rates,
+        }
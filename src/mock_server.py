@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+
+from mock import MockServer
+
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="aiwolf-nlpのモックゲームサーバ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--games", type=int, default=0, help="終了するまでのゲーム数(0は無制限)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--talk-turn", type=int, default=3)
+    parser.add_argument("--action-timeout", type=float, default=60)
+    parser.add_argument("--response-timeout", type=float, default=120)
+    parser.add_argument("--talk-on-first-day", action="store_true")
+    args = parser.parse_args()
+
+    server = MockServer(
+        host=args.host,
+        port=args.port,
+        game_num=args.games,
+        seed=args.seed,
+        max_talk_turn=args.talk_turn,
+        action_timeout=args.action_timeout,
+        response_timeout=args.response_timeout,
+        talk_on_first_day=args.talk_on_first_day,
+    )
+    try:
+        asyncio.run(server.serve())
+    finally:
+        logger.info(json.dumps(server.stats.summary(), ensure_ascii=False, indent=2))
@@ -1,9 +1,12 @@
 import configparser
 import logging
 import multiprocessing
+import multiprocessing.context
+import os
 from pathlib import Path
 
 import main
+from utils.llm.backend import BackendRegistry
 from utils.log_info import LogInfo
 
 logger = logging.getLogger(__name__)
@@ -14,9 +17,41 @@ logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
 
-if __name__ == "__main__":
-    multiprocessing.set_start_method("spawn")
+def preload_forkserver(
+    context: multiprocessing.context.BaseContext,
+    config: configparser.ConfigParser,
+) -> None:
+    # the forkserver does not apply this process's sys.path before preloading (Python 3.11),
+    # so the source directory reaches it through the environment it inherits
+    src_dir = str(Path(__file__).resolve().parent)
+    python_path = os.environ.get("PYTHONPATH", "")
+    if src_dir not in python_path.split(os.pathsep):
+        os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [src_dir, python_path]))
+
+    # the server process imports these once and every agent is forked from it, so no
+    # agent pays for importing main and the selected backend again
+    module_name = BackendRegistry.module_name(name=BackendRegistry.backend_name(config=config))
+    context.set_forkserver_preload(["main", *([module_name] if module_name is not None else [])])
+
+
+def get_context(config: configparser.ConfigParser) -> multiprocessing.context.BaseContext:
+    start_method = config.get("multiprocess", "start_method", fallback="spawn")
+    if start_method not in multiprocessing.get_all_start_methods():
+        logger.warning("%s はこの環境では使用できないため spawn を使用します", start_method)
+        start_method = "spawn"
+    # set globally so that LogInfo's shared values are created for the same start method
+    multiprocessing.set_start_method(start_method)
+    context = multiprocessing.get_context()
 
+    if start_method == "forkserver":
+        preload_forkserver(context=context, config=config)
+    elif start_method == "fork":
+        # forked agents inherit whatever this process has imported
+        BackendRegistry.preload(config=config)
+    return context
+
+
+if __name__ == "__main__":
     config_path = "./src/res/config.ini"
     if Path(config_path).exists():
         config = configparser.ConfigParser()
@@ -24,6 +59,8 @@ if __name__ == "__main__":
         logger.info("設定ファイルを読み込みました")
     else:
         raise FileNotFoundError(config_path, "設定ファイルが見つかりません")
+    context = get_context(config=config)
+    logger.info("プロセスの起動方法: %s", context.get_start_method())
     log_info = LogInfo()
 
     agent_num = int(config.get("agent", "num"))
@@ -31,7 +68,7 @@ if __name__ == "__main__":
 
     processes = []
     for i in range(agent_num):
-        process = multiprocessing.Process(
+        process = context.Process(
             name="p" + str(i + 1),
             target=main.execute,
             args=(
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import configparser
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils.log_info import LogInfo
+
+import main as runner
+from utils.action_executor import ActionExecutor
+from utils.async_websocket_client import AsyncWebSocketClient
+from utils.llm.event_loop import EventLoop
+
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+async def run_agent(
+    idx: int,
+    config: configparser.ConfigParser,
+    log_info: LogInfo,
+    executor: ThreadPoolExecutor,
+) -> None:
+    client = AsyncWebSocketClient(
+        url=config.get("websocket", "url"),
+    )
+    name = config.get("agent", f"name{idx}")
+    while True:
+        try:
+            await client.connect()
+            logger.info("エージェント %s がゲームサーバに接続しました", name)
+            break
+        except Exception as ex:  # noqa: BLE001
+            runner.log_connect_error(name=name, ex=ex)
+            await asyncio.sleep(runner.reconnect_interval)
+
+    agent, recorder = runner.create_agent(idx=idx, config=config, log_info=log_info)
+    loop = asyncio.get_running_loop()
+    while agent.running:
+        if len(agent.received) == 0:
+            runner.receive_packets(agent=agent, receive=await client.receive(), recorder=recorder)
+        agent.set_packet()
+        # the action blocks on LLM calls that are themselves awaited on this loop
+        req = await loop.run_in_executor(executor, agent.action, config)
+        agent, req = runner.finish_action(agent=agent, req=req, recorder=recorder)
+        if req != "":
+            await client.send(req=req)
+
+    await client.close()
+    runner.close_agent(agent=agent, recorder=recorder)
+
+
+async def execute(
+    idx: int,
+    config: configparser.ConfigParser,
+    log_info: LogInfo,
+    executor: ThreadPoolExecutor,
+) -> None:
+    while True:
+        for _ in range(config.getint("game", "num")):
+            await run_agent(
+                idx=idx,
+                config=config,
+                log_info=log_info,
+                executor=executor,
+            )
+
+        if not config.getboolean("connection", "keep_connection"):
+            break
+
+
+async def main(config: configparser.ConfigParser) -> None:
+    EventLoop.set_loop(asyncio.get_running_loop())
+    log_info = LogInfo()
+    runner.setup(config=config)
+
+    agent_num = config.getint("agent", "num")
+    logger.info("エージェント数: %d", agent_num)
+    ActionExecutor.set_max_workers(max_workers=agent_num)
+
+    with ThreadPoolExecutor(max_workers=agent_num, thread_name_prefix="agent") as executor:
+        await asyncio.gather(
+            *(
+                execute(
+                    idx=i + 1,
+                    config=config,
+                    log_info=log_info,
+                    executor=executor,
+                )
+                for i in range(agent_num)
+            ),
+        )
+
+    await runner.ateardown()
+
+
+if __name__ == "__main__":
+    config_path = "./src/res/config.ini"
+    if Path(config_path).exists():
+        config = configparser.ConfigParser()
+        config.read(config_path)
+        logger.info("設定ファイルを読み込みました")
+    else:
+        raise FileNotFoundError(config_path, "設定ファイルが見つかりません")
+
+    asyncio.run(main(config=config))
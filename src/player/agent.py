@@ -1,25 +1,30 @@
 from __future__ import annotations
 
-import json
+import concurrent.futures
+from collections import deque
 from typing import TYPE_CHECKING
 
 from res.prompt import Prompt
-from utils import agent_util
-from utils.llm.ChatGPT import AIWolfNLPChatGPT
+from utils import agent_util, json_util
+from utils.action_executor import ActionExecutor
+from utils.deadline import Deadline
+from utils.game_state import GameState
+from utils.llm.choice import parse_choice
+from utils.metrics import GameMetrics, Metrics
+from utils.talk_history import TalkHistory
+from utils.talk_speculator import TalkSpeculator
 
 if TYPE_CHECKING:
     import configparser
 
     from aiwolf_nlp_common.protocol.info import Info
-    from aiwolf_nlp_common.protocol.list.talk_list import TalkList
-    from aiwolf_nlp_common.protocol.list.whisper_list import WhisperList
     from aiwolf_nlp_common.protocol.setting import Setting
     from aiwolf_nlp_common.role import Role
 
     from utils.agent_log import AgentLog
+    from utils.llm.backend import Backend
 
-import random
-from threading import Thread
+import functools
 from typing import Callable
 
 from aiwolf_nlp_common import Action
@@ -28,6 +33,11 @@ from aiwolf_nlp_common.role import RoleInfo
 
 
 class Agent:
+    fallback_comment = "私は村人です！"
+    target_requests = frozenset(
+        (Action.VOTE.value, Action.DIVINE.value, Action.ATTACK.value),
+    )
+
     def __init__(
         self,
         name: str | None = None,
@@ -35,45 +45,66 @@ class Agent:
     ) -> None:
         self.name: str = name if name is not None else ""
         self.index: int = -1
-        self.received: list[str] = []
+        self.game_id: str | None = None
+        self.received: deque[str] = deque()
         self.role: Role = RoleInfo.VILLAGER.value
         self.action_timeout: int = 0
+        self.deadline_margin: float = Deadline.default_margin
+        self.deadline: Deadline = Deadline(timeout=0)
         self.packet: Packet | None = None
+        self.info_value: dict | None = None
+        self.setting_value: dict | None = None
         self.info: Info | None = None
         self.setting: Setting | None = None
-        self.talk_history: TalkList | None = None
-        self.whisper_history: WhisperList | None = None
+        self.talk_history = TalkHistory()
+        self.whisper_history = TalkHistory()
         self.agent_log = agent_log
+        self.metrics = GameMetrics()
+        if self.agent_log is not None:
+            self.agent_log.metrics = self.metrics
+        self.model: Backend | None = None
+        self.speculator: TalkSpeculator | None = None
+        self.game_state = GameState()
+        self.target_enable: bool = False
         self.running: bool = True
 
     @staticmethod
     def timeout(func: Callable) -> Callable:
+        @functools.wraps(func)
         def _wrapper(self, *args, **kwargs) -> str:  # noqa: ANN001, ANN002, ANN003
-            res = ""
+            # role classes decorate methods that call the already decorated super() method
+            if ActionExecutor.in_action():
+                return func(self, *args, **kwargs)
 
-            def execute_with_timeout() -> None:
-                nonlocal res
+            deadline = self.deadline
+            with self.metrics.measure(phase="action"):
                 try:
-                    res = func(self, *args, **kwargs)
-                except Exception as e:  # noqa: BLE001
-                    res = e
-
-            thread = Thread(target=execute_with_timeout, daemon=True)
-            thread.start()
-            if self.action_timeout > 0:
-                thread.join(timeout=self.action_timeout)
-            else:
-                thread.join()
-
-            if isinstance(res, Exception):
-                raise res
-
+                    res = ActionExecutor.call(
+                        functools.partial(func, self, *args, **kwargs),
+                        timeout=deadline.budget(),
+                    )
+                except TimeoutError:
+                    if self.agent_log is not None:
+                        self.agent_log.error_message(
+                            error_message=f"{func.__name__} timed out "
+                            f"after {deadline.elapsed():.3f}s",
+                        )
+                    self.metrics.fallback()
+                    res = self.fallback(action=func.__name__)
+
+            if deadline.record() and self.agent_log is not None:
+                self.agent_log.error_message(
+                    error_message=f"{func.__name__} missed the deadline "
+                    f"({deadline.elapsed():.3f}s / {deadline.timeout}s)",
+                )
+            self.record_event(response=res)
             return res
 
         return _wrapper
 
     @staticmethod
     def send_agent_index(func: Callable) -> Callable:
+        @functools.wraps(func)
         def _wrapper(self, *args, **kwargs) -> str:  # noqa: ANN001, ANN002, ANN003
             res = func(self, *args, **kwargs)
             if type(res) is not int:
@@ -82,6 +113,90 @@ class Agent:
 
         return _wrapper
 
+    def fallback(self, action: str) -> str:
+        if action == "get_name":
+            return self.name
+        if action == "talk":
+            return self.fallback_comment
+        if action == "vote":
+            return agent_util.agent_idx_to_agent(idx=self.fallback_target())
+        return ""
+
+    def target_candidates(self, exclude: set[str] | None = None) -> list[str]:
+        exclude = set(exclude or ())
+        if self.info is not None:
+            exclude.add(self.info.agent)
+        candidates = [agent for agent in self.alive_agents() if agent not in exclude]
+        if len(candidates) == 0:
+            candidates = self.alive_agents()
+        return candidates
+
+    def fallback_target(
+        self,
+        exclude: set[str] | None = None,
+        request: str = Action.VOTE.value,
+    ) -> int:
+        return agent_util.agent_name_to_idx(
+            name=self.game_state.choose(
+                candidates=self.target_candidates(exclude=exclude),
+                request=request,
+            ),
+        )
+
+    def choose_target(self, request: str, exclude: set[str] | None = None) -> int:
+        candidates = self.target_candidates(exclude=exclude)
+        if not self.target_enable or self.model is None:
+            return self.fallback_target(exclude=exclude, request=request)
+
+        try:
+            # only the talks the model has not seen yet are sent, on top of its conversation
+            talks = self.model.context.unsent_talks(talk_history=self.talk_history)
+            with self.metrics.measure(phase="prompt"):
+                target_prompt = Prompt.get_target_prompt(
+                    name=request.lower(),
+                    talk_history=talks,
+                    candidates=candidates,
+                    state=self.game_state.summary(),
+                    role=self.role,
+                )
+            with self.metrics.measure(phase="llm"):
+                answer = self.model.create_comment(
+                    content=target_prompt,
+                    deadline=self.deadline,
+                    choices=candidates,
+                )
+            # the question and its answer leave the conversation again, so target prompts never
+            # pile up in it; the talks stay unsent and go into the next talk prompt instead
+            usage = self.model.context.last_usage()
+            self.model.rollback()
+            ActionExecutor.check_cancelled()
+            self.add_usage(usage=usage)
+            self.agent_log.prompt(prompt_text=target_prompt)
+            # the answer is checked against the agents alive in the latest status map
+            target = parse_choice(text=answer, choices=candidates)
+            if target is None:
+                raise ValueError(answer, "候補にないエージェントが選ばれました")
+        except concurrent.futures.CancelledError:
+            raise
+        except Exception as e:
+            # errors of a cancelled action come from aborting its request
+            ActionExecutor.check_cancelled()
+            self.agent_log.error_message(error_message=str(e))
+            self.metrics.error()
+            self.metrics.fallback()
+            target = self.game_state.choose(candidates=candidates, request=request)
+        return agent_util.agent_name_to_idx(name=target)
+
+    def add_usage(self, usage: tuple[int, int, int] | None = None) -> None:
+        prompt_tokens, completion_tokens, cached_tokens = (
+            usage if usage is not None else self.model.context.last_usage()
+        )
+        self.metrics.add_tokens(
+            prompt=prompt_tokens,
+            completion=completion_tokens,
+            cached=cached_tokens,
+        )
+
     def append_recv(self, recv: str | list[str]) -> None:
         if type(recv) is str:
             self.received.append(recv)
@@ -89,13 +204,57 @@ class Agent:
             self.received.extend(recv)
 
     def set_packet(self) -> None:
-        value = json.loads(self.received.pop(0))
-        if self.packet is None:
-            self.packet = Packet(
-                value=value,
-            )
-        else:
-            self.packet.update(value=value)
+        self.deadline = Deadline(timeout=self.action_timeout, margin=self.deadline_margin)
+        with self.metrics.measure(phase="parse"):
+            value = json_util.loads(self.received.popleft())
+            if self.packet is None:
+                changed = value
+                self.packet = Packet(
+                    value=value,
+                )
+            else:
+                changed = self.changed_value(value=value)
+                self.packet.update(value=changed)
+            if changed.get("info") is not None and self.packet.info is not None:
+                self.game_state.update(info=self.packet.info)
+            if value.get("info") is not None:
+                self.info_value = value["info"]
+            if value.get("setting") is not None:
+                self.setting_value = value["setting"]
+            self.metrics.start_request(request=self.packet.request)
+            if Action.is_initialize(request=self.packet.request):
+                self.game_id = agent_util.find_game_id(value=value)
+
+    def record_event(self, response: object = None) -> None:
+        if self.agent_log is None or self.packet is None:
+            return
+
+        prompt_tokens, completion_tokens, cached_tokens = self.metrics.request_tokens
+        target = None
+        if self.packet.request in Agent.target_requests and response:
+            target = str(response)
+        self.agent_log.event(
+            day=self.info.day if self.info is not None else None,
+            agent=self.info.agent if self.info is not None else None,
+            role=self.role.en,
+            request=self.packet.request,
+            target=target,
+            text=str(response) if response and target is None else None,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            latency=self.deadline.elapsed(),
+            fallback=self.metrics.request_fallback,
+        )
+
+    def changed_value(self, value: dict) -> dict:
+        # Packet.update rebuilds every block it is given; leave out the ones that are unchanged
+        changed = dict(value)
+        if changed.get("info") is not None and changed["info"] == self.info_value:
+            del changed["info"]
+        if changed.get("setting") is not None and changed["setting"] == self.setting_value:
+            del changed["setting"]
+        return changed
 
     def initialize(self, config: configparser.ConfigParser) -> None:
         if self.packet is not None:
@@ -104,37 +263,61 @@ class Agent:
         if self.info is None or self.setting is None:
             return
 
+        if self.agent_log is not None:
+            self.agent_log.open(game_id=self.game_id)
+
         self.index = agent_util.agent_name_to_idx(name=self.info.agent)
         self.action_timeout = self.setting.action_timeout
+        self.deadline_margin = config.getfloat(
+            "deadline",
+            "margin",
+            fallback=Deadline.default_margin,
+        )
         self.role = self.info.role_map.get_role(agent=self.info.agent)
+        self.metrics.role = self.role.en
 
-        system_instruction=Prompt.get_common_prompt(agent_name=self.info.agent, role=self.role)
+        with self.metrics.measure(phase="prompt"):
+            stable_instruction = Prompt.get_stable_prompt(role=self.role)
+            system_instruction=Prompt.get_common_prompt(agent_name=self.info.agent, role=self.role)
         self.model = agent_util.set_model(
             config=config,
             system_instruction=system_instruction,
+            stable_instruction=stable_instruction,
         )
+        self.agent_log.prompt(prompt_text=stable_instruction)
         self.agent_log.prompt(prompt_text=system_instruction)
 
-        if type(self.model) is AIWolfNLPChatGPT:
-            self.model.set_action_time_out(action_timeout=self.action_timeout)
+        self.model.set_action_time_out(action_timeout=self.action_timeout)
+
+        self.target_enable = config.getboolean("target", "enable", fallback=False)
+
+        if config.getboolean("speculation", "enable", fallback=False):
+            self.speculator = TalkSpeculator(
+                wait=config.getfloat("speculation", "wait", fallback=0.1),
+            )
+
+        self.record_event()
 
     def daily_initialize(self) -> None:
         if self.packet is not None:
             self.setting = self.packet.setting
+        self.record_event()
 
         if self.info is None or self.setting is None:
             return
 
     def daily_finish(self) -> None:
+        if self.speculator is not None:
+            self.speculator.cancel()
+
         if self.packet is not None:
-            if self.talk_history is None:
-                self.talk_history = self.packet.talk_history
-            elif self.packet.talk_history is not None:
-                self.talk_history.extend(self.packet.talk_history)
-            if self.whisper_history is None:
-                self.whisper_history = self.packet.whisper_history
-            elif self.packet.whisper_history is not None:
-                self.whisper_history.extend(self.packet.whisper_history)
+            self.add_talks()
+            self.whisper_history.add(talks=self.packet.whisper_history)
+        self.record_event()
+
+    def add_talks(self) -> None:
+        # only the talks new to the history are scored
+        self.game_state.add_talks(talks=self.talk_history.add(talks=self.packet.talk_history))
 
     @timeout
     def get_name(self) -> str:
@@ -147,18 +330,69 @@ class Agent:
     @timeout
     def talk(self) -> str:
         if self.packet is not None:
-            if self.talk_history is None:
-                self.talk_history = self.packet.talk_history
-            elif self.packet.talk_history is not None:
-                self.talk_history.extend(self.packet.talk_history)
+            self.add_talks()
 
         try:
-            talk_prompt = Prompt.get_talk_prompt(talk_history=self.talk_history)
-            comment = self.model.create_comment(content=talk_prompt)
+            talks = self.model.context.unsent_talks(talk_history=self.talk_history)
+            draft = None
+            if self.speculator is not None and self.info is not None:
+                draft = self.speculator.take(day=self.info.day)
+
+            if draft is not None:
+                # the draft joins the conversation and only the talks it did not see are sent
+                # on top of it; an answer of TalkSpeculator.keep keeps the draft as it is
+                talk_prompt = draft.prompt
+                comment = draft.future.result()
+                self.model.commit(content=talk_prompt, comment=comment)
+                self.model.context.mark_sent(talks=draft.talks)
+                talks = TalkSpeculator.new_talks(draft=draft, talks=talks)
+                if talks:
+                    # the draft's own usage is counted before the refresh replaces it
+                    self.add_usage()
+                    self.agent_log.prompt(prompt_text=draft.prompt)
+                    with self.metrics.measure(phase="prompt"):
+                        talk_prompt = Prompt.get_refresh_prompt(
+                            talk_history=talks,
+                            keep=TalkSpeculator.keep,
+                            role=self.role,
+                        )
+                    with self.metrics.measure(phase="llm"):
+                        answer = self.model.create_comment(
+                            content=talk_prompt,
+                            deadline=self.deadline,
+                        )
+                    if not TalkSpeculator.is_kept(answer=answer):
+                        comment = answer
+                    self.model.context.mark_sent(talks=talks)
+            else:
+                with self.metrics.measure(phase="prompt"):
+                    talk_prompt = Prompt.get_talk_prompt(talk_history=talks, role=self.role)
+                with self.metrics.measure(phase="llm"):
+                    comment = self.model.create_comment(
+                        content=talk_prompt,
+                        deadline=self.deadline,
+                    )
+                self.model.context.mark_sent(talks=talks)
+            ActionExecutor.check_cancelled()
+            self.add_usage()
             self.agent_log.prompt(prompt_text=talk_prompt)
+        except concurrent.futures.CancelledError:
+            raise
         except Exception as e:
+            # errors of a cancelled action come from aborting its request
+            ActionExecutor.check_cancelled()
             self.agent_log.error_message(error_message=str(e))
-            comment = "私は村人です！"
+            self.metrics.error()
+            self.metrics.fallback()
+            comment = self.fallback_comment
+
+        if self.speculator is not None and self.info is not None:
+            self.speculator.start(
+                model=self.model,
+                day=self.info.day,
+                talks=self.model.context.unsent_talks(talk_history=self.talk_history),
+                role=self.role,
+            )
 
         if self.agent_log is not None:
             self.agent_log.talk(comment=comment)
@@ -167,9 +401,9 @@ class Agent:
     @timeout
     @send_agent_index
     def vote(self) -> int:
-        target: int = agent_util.agent_name_to_idx(
-            name=random.choice(self.alive_agents()),  # noqa: S311
-        )
+        if self.packet is not None:
+            self.add_talks()
+        target: int = self.choose_target(request=Action.VOTE.value)
         if self.agent_log is not None:
             self.agent_log.vote(vote_target=target)
         return target
@@ -177,18 +411,24 @@ class Agent:
     @timeout
     def whisper(self) -> None:
         if self.packet is not None:
-            if self.whisper_history is None:
-                self.whisper_history = self.packet.whisper_history
-            elif self.packet.whisper_history is not None:
-                self.whisper_history.extend(self.packet.whisper_history)
+            self.whisper_history.add(talks=self.packet.whisper_history)
 
     def finish(self) -> None:
         self.running = False
 
-        if type(self.model) is AIWolfNLPChatGPT:
+        if self.speculator is not None:
+            self.speculator.cancel()
+
+        if self.model is not None:
             self.model.close()
 
-        if self.agent_log is not None and self.agent_log.is_write:
+        Metrics.count_agent_game()
+        Metrics.export()
+
+        self.record_event()
+        if self.agent_log is not None:
+            self.agent_log.metrics_summary(summary=self.metrics.summary())
+        if self.agent_log is not None:
             self.agent_log.close()
 
     def action(self, config: configparser.ConfigParser) -> str:  # noqa: C901
@@ -219,15 +459,24 @@ class Agent:
         self.name = prev_agent.name
         self.model = prev_agent.model
         self.index = prev_agent.index
+        self.game_id = prev_agent.game_id
         self.received = prev_agent.received
         self.role = prev_agent.role
         self.action_timeout = prev_agent.action_timeout
+        self.deadline_margin = prev_agent.deadline_margin
+        self.deadline = prev_agent.deadline
         self.packet = prev_agent.packet
+        self.info_value = prev_agent.info_value
+        self.setting_value = prev_agent.setting_value
         self.info = prev_agent.info
         self.setting = prev_agent.setting
         self.talk_history = prev_agent.talk_history
         self.whisper_history = prev_agent.whisper_history
         self.agent_log = prev_agent.agent_log
+        self.metrics = prev_agent.metrics
+        self.speculator = prev_agent.speculator
+        self.game_state = prev_agent.game_state
+        self.target_enable = prev_agent.target_enable
         self.alive_agents = prev_agent.alive_agents
         self.running = prev_agent.running
 
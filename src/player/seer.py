@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-import random
-
 from aiwolf_nlp_common import Action
 
 from player.agent import Agent
@@ -51,13 +49,25 @@ class Seer(Agent):
     @Agent.timeout
     @Agent.send_agent_index
     def divine(self) -> int:
-        target: int = agent_util.agent_name_to_idx(
-            name=random.choice(self.alive_agents()),  # noqa: S311
+        # an agent whose result is already known is not worth another night
+        target: int = self.choose_target(
+            request=Action.DIVINE.value,
+            exclude=set(self.game_state.divine_results),
         )
         if self.agent_log is not None:
             self.agent_log.divine(divine_target=target)
         return target
 
+    def fallback(self, action: str) -> str:
+        if action == "divine":
+            return agent_util.agent_idx_to_agent(
+                idx=self.fallback_target(
+                    exclude=set(self.game_state.divine_results),
+                    request=Action.DIVINE.value,
+                ),
+            )
+        return super().fallback(action=action)
+
     def action(self, config):
         if self.packet is not None:
             self.info = self.packet.info
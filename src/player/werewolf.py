@@ -1,8 +1,7 @@
 from __future__ import annotations
 
-import random
-
 from aiwolf_nlp_common import Action
+from aiwolf_nlp_common.role import RoleInfo
 
 from player.agent import Agent
 from utils import agent_util
@@ -51,13 +50,30 @@ class Werewolf(Agent):
     @Agent.timeout
     @Agent.send_agent_index
     def attack(self) -> int:
-        target: int = agent_util.agent_name_to_idx(
-            random.choice(self.alive_agents()),  # noqa: S311
+        target: int = self.choose_target(
+            request=Action.ATTACK.value,
+            exclude=self.werewolves(),
         )
         if self.agent_log is not None:
             self.agent_log.attack(attack_target=target)
         return target
 
+    def fallback(self, action: str) -> str:
+        if action == "attack":
+            return agent_util.agent_idx_to_agent(
+                idx=self.fallback_target(exclude=self.werewolves(), request=Action.ATTACK.value),
+            )
+        return super().fallback(action=action)
+
+    def werewolves(self) -> set[str]:
+        if self.info is None:
+            return set()
+        return {
+            agent_role.agent
+            for agent_role in self.info.role_map
+            if RoleInfo.is_werewolf(role=agent_role.role)
+        }
+
     def action(self, config):
         if self.packet is not None:
             self.info = self.packet.info
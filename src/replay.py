@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import argparse
+import configparser
+import cProfile
+import json
+import logging
+import time
+from pathlib import Path
+
+from utils.agent_log import AgentLog
+from utils.log_info import LogInfo
+
+import main as runner
+import player
+from utils.metrics import Metrics
+from utils.session_log import SessionReader
+
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+def replay(
+    path: Path,
+    config: configparser.ConfigParser,
+    log_info: LogInfo,
+    speed: float,
+) -> dict:
+    reader = SessionReader(path=path)
+    name = reader.header.get("name", path.stem)
+    agent = player.agent.Agent(
+        name=name,
+        agent_log=AgentLog(config=config, agent_name=name, log_info=log_info),
+    )
+
+    # the same steps as main.run_agent, with the recording in place of the socket
+    responses: list[str] = []
+    packet_num = 0
+    start = time.monotonic()
+    for elapsed, text in reader.received():
+        if speed > 0:
+            # keep the recorded gaps; time spent in the agent counts towards them
+            wait = elapsed / speed - (time.monotonic() - start)
+            if wait > 0:
+                time.sleep(wait)
+        agent.append_recv(recv=text)
+        packet_num += 1
+        while agent.running and len(agent.received) > 0:
+            agent.set_packet()
+            req = agent.action(config=config)
+            agent, req = runner.finish_action(agent=agent, req=req, recorder=None)
+            if req != "":
+                responses.append(req)
+        if not agent.running:
+            break
+    replay_elapsed = time.monotonic() - start
+
+    recorded = reader.sent()
+    changed = sum(1 for new, old in zip(responses, recorded) if new != old)
+    return {
+        "file": str(path),
+        "name": name,
+        "packets": packet_num,
+        "responses": len(responses),
+        "recorded_responses": len(recorded),
+        "changed_responses": changed + abs(len(responses) - len(recorded)),
+        "elapsed": replay_elapsed,
+        "recorded_elapsed": reader.frames[-1][0] if reader.frames else 0.0,
+    }
+
+
+def main(
+    paths: list[Path],
+    config: configparser.ConfigParser,
+    speed: float,
+) -> dict:
+    log_info = LogInfo()
+    runner.setup(config=config)
+
+    try:
+        sessions = [
+            replay(path=path, config=config, log_info=log_info, speed=speed) for path in paths
+        ]
+    finally:
+        runner.teardown()
+    return {"sessions": sessions, "agent_metrics": Metrics.summary()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="記録したゲームサーバとの通信をエージェントで再生")
+    parser.add_argument("recordings", nargs="+", help="[record]で記録したファイル")
+    parser.add_argument("--config", default="./src/res/config.ini")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="記録時の何倍の速さで再生するか (0は待たずに再生)",
+    )
+    parser.add_argument("--profile", default=None, help="cProfileの結果を書き出すファイル")
+    parser.add_argument("--output", default=None, help="結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    if Path(args.config).exists():
+        config = configparser.ConfigParser()
+        config.read(args.config)
+        logger.info("設定ファイルを読み込みました")
+    else:
+        raise FileNotFoundError(args.config, "設定ファイルが見つかりません")
+
+    paths = [Path(recording) for recording in args.recordings]
+    for path in paths:
+        if not path.is_file():
+            raise FileNotFoundError(path, "記録ファイルが見つかりません")
+
+    profiler = cProfile.Profile() if args.profile is not None else None
+    if profiler is not None:
+        profiler.enable()
+    summary = main(paths=paths, config=config, speed=args.speed)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    logger.info(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(summary, ensure_ascii=False, indent=2))
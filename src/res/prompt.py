@@ -1,34 +1,150 @@
 from __future__ import annotations
 
 import re
-from typing import Callable
+import string
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-from aiwolf_nlp_common.protocol.list.talk_list import TalkList
-from aiwolf_nlp_common.role import Role
+if TYPE_CHECKING:
+    import configparser
+
+    from aiwolf_nlp_common.role import Role
+
+    from utils.talk_history import Talk
 
 
 class Prompt:
-    def format_text(func: Callable):
-        def _wrapper(*args, **keywords):
-            # execute function
-            result: str = func(*args, **keywords)
+    template_dir = Path(__file__).parent / "templates"
+    language = "ja"
+    suffix = ".txt"
+
+    # variables each built-in template may use; checked once when the templates are loaded
+    variables: dict[str, frozenset[str]] = {  # noqa: RUF012
+        "rules": frozenset(("role",)),
+        "strategy": frozenset(("role",)),
+        "common": frozenset(("agent_name", "role")),
+        "talk": frozenset(("talks",)),
+        "refresh": frozenset(("talks", "keep")),
+        "vote": frozenset(("talks", "candidates", "state")),
+        "divine": frozenset(("talks", "candidates", "state")),
+        "attack": frozenset(("talks", "candidates", "state")),
+    }
+    # templates that make up the part of the system prompt shared by every game
+    stable_templates = ("rules", "strategy")
+
+    __templates: dict[tuple[str, str], string.Template] = {}  # noqa: RUF012
+    __lock = threading.Lock()
 
-            return re.sub(r"^\s+(.+)", r"\1", result, flags=re.MULTILINE)
+    @classmethod
+    def configure(cls, config: configparser.ConfigParser) -> None:
+        cls.template_dir = Path(
+            config.get("prompt", "template_dir", fallback=str(Prompt.template_dir)),
+        )
+        cls.language = config.get("prompt", "language", fallback=Prompt.language)
+        cls.load()
+
+    @classmethod
+    def load(cls) -> None:
+        language_dir = Path.joinpath(cls.template_dir, cls.language)
+        if not language_dir.is_dir():
+            raise FileNotFoundError(language_dir, "プロンプトのテンプレートが見つかりません")
+
+        # <language>/<name>.txt is shared by every role; <language>/<role>/<name>.txt overrides it
+        templates: dict[tuple[str, str], string.Template] = {}
+        for path in language_dir.glob(f"*{cls.suffix}"):
+            templates["", path.stem] = cls.compile(path=path)
+        for path in language_dir.glob(f"*/*{cls.suffix}"):
+            templates[path.parent.name.upper(), path.stem] = cls.compile(path=path)
+
+        with cls.__lock:
+            cls.__templates = templates
+
+    @classmethod
+    def compile(cls, path: Path) -> string.Template:
+        # strip the indentation once here so rendering is a single substitution
+        text = re.sub(r"^\s+(.+)", r"\1", path.read_text(encoding="utf-8"), flags=re.MULTILINE)
+        template = string.Template(text)
+        if not template.is_valid():
+            raise ValueError(path, "テンプレートの書式が正しくありません")
+        unknown = set(template.get_identifiers()) - cls.variables.get(path.stem, frozenset())
+        if path.stem in cls.variables and unknown:
+            raise ValueError(path, f"使用できない変数があります: {', '.join(sorted(unknown))}")
+        return template
+
+    @classmethod
+    def find_template(cls, name: str, role: Role | None = None) -> string.Template | None:
+        with cls.__lock:
+            templates = cls.__templates
+        if not templates:
+            cls.load()
+            with cls.__lock:
+                templates = cls.__templates
 
-        return _wrapper
+        if role is not None and (role.en, name) in templates:
+            return templates[role.en, name]
+        return templates.get(("", name))
+
+    @classmethod
+    def get_template(cls, name: str, role: Role | None = None) -> string.Template:
+        template = cls.find_template(name=name, role=role)
+        if template is None:
+            raise KeyError(name, "プロンプトのテンプレートが見つかりません")
+        return template
+
+    @classmethod
+    def role_name(cls, role: Role) -> str:
+        return role.ja if cls.language == "ja" else role.en
+
+    @classmethod
+    def get_stable_prompt(cls, role: Role) -> str:
+        # depends only on the role, so it is byte-identical across turns and games
+        # and can be served from the provider's prompt cache
+        texts = []
+        for name in Prompt.stable_templates:
+            template = cls.find_template(name=name, role=role)
+            if template is not None:
+                texts.append(template.substitute(role=cls.role_name(role=role)))
+        return "\n".join(text.strip("\n") for text in texts if text.strip())
 
     @classmethod
-    @format_text
     def get_common_prompt(cls, agent_name: str, role: Role) -> str:
-        return f"""あなたは人狼ゲームのプレイヤーの一員として、会話を行なってください。
-        あなたのゲーム中での名前は{agent_name}です。
-        あなたの役職は{role.ja}です。
-        """
-
-    @classmethod
-    @format_text
-    def get_talk_prompt(cls, talk_history: TalkList) -> str:
-        talk_history_text = "\n".join([f"{talk.agent}:{talk.text}" for talk in talk_history])
-        return f"""以下は今までの会話履歴です。会話に次ぐ発言をしてください。
-        {talk_history_text}
-        """
+        return cls.get_template(name="common", role=role).substitute(
+            agent_name=agent_name,
+            role=cls.role_name(role=role),
+        )
+
+    @classmethod
+    def get_talk_prompt(cls, talk_history: list[Talk], role: Role | None = None) -> str:
+        return cls.get_template(name="talk", role=role).substitute(
+            talks="\n".join([talk.line for talk in talk_history]),
+        )
+
+    @classmethod
+    def get_refresh_prompt(
+        cls,
+        talk_history: list[Talk],
+        keep: str,
+        role: Role | None = None,
+    ) -> str:
+        talks = "\n".join([talk.line for talk in talk_history])
+        template = cls.find_template(name="refresh", role=role)
+        if template is None:
+            # template directories written before drafts were refreshed have no refresh.txt
+            return cls.get_template(name="talk", role=role).substitute(talks=talks)
+        return template.substitute(talks=talks, keep=keep)
+
+    @classmethod
+    def get_target_prompt(
+        cls,
+        name: str,
+        talk_history: list[Talk],
+        candidates: list[str],
+        state: str = "",
+        role: Role | None = None,
+    ) -> str:
+        return cls.get_template(name=name, role=role).substitute(
+            talks="\n".join([talk.line for talk in talk_history]),
+            candidates=", ".join(candidates),
+            state=state,
+        )
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from mock.simulator import Simulator
+
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+def parse_role_policies(values: list[str]) -> dict[str, str]:
+    role_policies = {}
+    for value in values:
+        role, _, policy = value.partition("=")
+        if not policy:
+            raise ValueError(value, "ROLE=POLICY の形式で指定してください")
+        role_policies[role.upper()] = policy
+    return role_policies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="サーバと生成AIを使用せずに投票・占い・襲撃の方針を評価するシミュレーション",
+    )
+    parser.add_argument("--games", type=int, default=10000, help="同時に実行するゲーム数")
+    parser.add_argument("--policy", default="suspicion", help="全役職に使用する方針")
+    parser.add_argument(
+        "--role-policy",
+        action="append",
+        default=[],
+        help="役職ごとに使用する方針 (例: WEREWOLF=random)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake-claim", type=float, default=0.5, help="人狼陣営が占い師を騙る確率")
+    parser.add_argument("--output", default=None, help="結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    summary = Simulator(
+        games=args.games,
+        policy=args.policy,
+        role_policies=parse_role_policies(values=args.role_policy),
+        seed=args.seed,
+        fake_claim=args.fake_claim,
+    ).run()
+    logger.info(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(summary, ensure_ascii=False, indent=2))
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import argparse
+import configparser
+import json
+import logging
+import multiprocessing
+import resource
+import time
+from pathlib import Path
+
+import multi
+from utils.llm.backend import BackendRegistry
+
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def warm_up(
+    config: configparser.ConfigParser,
+    started: float,
+    results: multiprocessing.Queue,
+) -> None:
+    # what an agent process does before it first connects to the server
+    import main  # noqa: F401
+
+    BackendRegistry.preload(config=config)
+    results.put((time.time() - started, cpu_seconds()))
+
+
+def measure(
+    context: multiprocessing.context.BaseContext,
+    config: configparser.ConfigParser,
+    agent_num: int,
+) -> dict:
+    results = context.Queue()
+    started = time.time()
+    processes = [
+        context.Process(target=warm_up, args=(config, started, results))
+        for _ in range(agent_num)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    ready = sorted(ready for ready, _ in reports)
+    return {
+        "first_ready": ready[0],
+        "all_ready": ready[-1],
+        "cpu_per_agent": sum(cpu for _, cpu in reports) / agent_num,
+    }
+
+
+def run_startup_benchmark(
+    config: configparser.ConfigParser,
+    agent_num: int,
+    rounds: int,
+    methods: list[str],
+) -> dict:
+    summary: dict = {"agents": agent_num, "backend": BackendRegistry.backend_name(config=config)}
+    for method in methods:
+        if method not in multiprocessing.get_all_start_methods():
+            logger.warning("%s はこの環境では使用できません", method)
+            continue
+        context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            multi.preload_forkserver(context=context, config=config)
+        elif method == "fork":
+            BackendRegistry.preload(config=config)
+        # the forkserver starts with the first process, so later rounds show it pre-warmed
+        summary[method] = [
+            measure(context=context, config=config, agent_num=agent_num) for _ in range(rounds)
+        ]
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="エージェントのプロセスの起動時間のベンチマーク")
+    parser.add_argument("--config", default="./src/res/config.ini")
+    parser.add_argument("--agents", type=int, default=15, help="起動するプロセス数")
+    parser.add_argument("--rounds", type=int, default=2, help="各起動方法で起動を繰り返す回数")
+    parser.add_argument(
+        "--methods",
+        default="spawn,forkserver",
+        help="比較する起動方法 (spawn, forkserver, fork)",
+    )
+    parser.add_argument("--backend", default=None, help="使用する生成AIのバックエンド")
+    parser.add_argument("--output", default=None, help="結果をJSONで書き出すファイル")
+    args = parser.parse_args()
+
+    if Path(args.config).exists():
+        config = configparser.ConfigParser()
+        config.read(args.config)
+        logger.info("設定ファイルを読み込みました")
+    else:
+        raise FileNotFoundError(args.config, "設定ファイルが見つかりません")
+    if args.backend is not None:
+        config.set("model", "backend", args.backend)
+
+    summary = run_startup_benchmark(
+        config=config,
+        agent_num=args.agents,
+        rounds=args.rounds,
+        methods=args.methods.split(","),
+    )
+    logger.info(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(summary, ensure_ascii=False, indent=2))
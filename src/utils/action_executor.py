@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import concurrent.futures
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from utils.llm.event_loop import CancelScope, EventLoop
+
+T = TypeVar("T")
+
+
+class ActionExecutor:
+    __executor: ThreadPoolExecutor | None = None
+    __max_workers: int | None = None
+    __lock = threading.Lock()
+
+    @classmethod
+    def set_max_workers(cls, max_workers: int) -> None:
+        with cls.__lock:
+            if cls.__executor is not None:
+                cls.__executor.shutdown(wait=False)
+                cls.__executor = None
+            cls.__max_workers = max_workers
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        with cls.__lock:
+            if cls.__executor is None:
+                cls.__executor = ThreadPoolExecutor(
+                    max_workers=cls.__max_workers,
+                    thread_name_prefix="action",
+                )
+            return cls.__executor
+
+    @classmethod
+    def in_action(cls) -> bool:
+        return EventLoop.get_scope() is not None
+
+    @classmethod
+    def check_cancelled(cls) -> None:
+        # a timed out action has already been answered with a fallback, so it must stop here
+        scope = EventLoop.get_scope()
+        if scope is not None and scope.cancelled:
+            raise concurrent.futures.CancelledError
+
+    @classmethod
+    def call(cls, func: Callable[[], T], timeout: float | None = None) -> T:
+        scope = CancelScope()
+
+        def _task() -> T:
+            if scope.cancelled:
+                raise concurrent.futures.CancelledError
+            EventLoop.set_scope(scope)
+            try:
+                return func()
+            finally:
+                EventLoop.set_scope(None)
+
+        future = cls.get_executor().submit(_task)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # stop the worker from finishing the action late and release its LLM request
+            future.cancel()
+            scope.cancel()
+            raise TimeoutError(timeout, "アクションがタイムアウトしました") from None
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls.__lock:
+            if cls.__executor is not None:
+                cls.__executor.shutdown(wait=False, cancel_futures=True)
+                cls.__executor = None
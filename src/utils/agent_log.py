@@ -1,11 +1,15 @@
 import configparser
 import datetime
+import json
+import time
 from pathlib import Path
 from typing import Callable
 
 from utils import agent_util
+from utils.event_log import EventLog
 from utils.log import Log
 from utils.log_info import LogInfo
+from utils.metrics import GameMetrics
 
 
 class AgentLog(Log):
@@ -26,49 +30,15 @@ class AgentLog(Log):
         else:
             raise FileNotFoundError(log_config_path, "設定ファイルが見つかりません")
 
-        current_time = datetime.datetime.now()  # noqa: DTZ005
-
-        if log_info.log_num % config.getint("agent", "num") == 0:
-            log_info.game_start_time = current_time
-        else:
-            current_time = datetime.datetime.strptime(  # noqa: DTZ007
-                log_info.game_start_time,
-                LogInfo.format,
-            )
-
-        log_info.increment_log_num()
-
+        self.agent_name = agent_name
+        self.log_info = log_info
+        self.agent_num = config.getint("agent", "num")
+        self.metrics: GameMetrics | None = None
         self.is_write = log_config.getboolean("log", "write")
+        self.is_open = False
         self.log_dir_path = Path(log_config.get("path", "output_dir"))
-        self.log_month_day_dir = Path.joinpath(
-            self.log_dir_path,
-            current_time.strftime("%m-%d"),
-        )
-
-        dir_num = 0
-        if log_info.log_times_num == 0:
-            if self.log_month_day_dir.exists():
-                dir_num = (
-                    len(
-                        [
-                            d.name
-                            for d in self.log_month_day_dir.iterdir()
-                            if d.is_dir()
-                        ],
-                    )
-                    + 1
-                )
-            else:
-                dir_num = 1
-            log_info.log_times_num = dir_num
-        else:
-            dir_num = log_info.log_times_num
-
-        self.log_times = Path.joinpath(self.log_month_day_dir, str(dir_num))
-        self.log_file_path = Path.joinpath(
-            self.log_times,
-            current_time.strftime("%H-%M-%S-%f") + "_" + agent_name + ".log",
-        )
+        self.is_event = log_config.getboolean("log", "event", fallback=False)
+        self.is_event_compress = log_config.getboolean("log", "event_compress", fallback=False)
 
         # load [log] flags
         self.log_flag_dict = {}  # key: func_name , value: flag
@@ -77,38 +47,65 @@ class AgentLog(Log):
         self.log_flag_dict["talk"] = log_config.getboolean("log", "talk")
         self.log_flag_dict["vote"] = log_config.getboolean("log", "vote")
 
-        if not self.is_write:
-            return
+        self.event_log: EventLog | None = None
+        # events that arrive before the game directory is known, such as NAME
+        self.pending_events: list[dict] = []
 
-        self.prepare_log_dir()
+    def open(self, game_id: str | None = None) -> None:
+        if self.is_open or not self.is_write:
+            return
 
-        super().__init__(filename=self.log_file_path, name=agent_name)
+        current_time = datetime.datetime.now()  # noqa: DTZ005
+        if game_id is not None:
+            # every agent of a game derives the same directory from the server's game ID
+            self.log_times = Path.joinpath(self.log_dir_path, game_id)
+        else:
+            game_start_time = self.log_info.next_game_start_time(agent_num=self.agent_num)
+            self.log_times = Path.joinpath(
+                self.log_dir_path,
+                game_start_time.strftime("%m-%d"),
+                game_start_time.strftime("%H-%M-%S-%f"),
+            )
+        self.game = self.log_times.relative_to(self.log_dir_path).as_posix()
+        self.log_file_path = Path.joinpath(
+            self.log_times,
+            current_time.strftime("%H-%M-%S-%f") + "_" + self.agent_name + ".log",
+        )
 
-        log_info.increment_log_prepare_done_num()
+        Log.prepare_dir(path=self.log_times)
+        super().__init__(filename=self.log_file_path, name=self.agent_name)
+        self.is_open = True
 
-        if log_info.log_prepare_done_num % config.getint("agent", "num") == 0:
-            log_info.reset_params()
+        if self.is_event:
+            self.event_log = EventLog(
+                game_dir=self.log_times,
+                game=self.game,
+                agent_name=self.agent_name,
+                compress=self.is_event_compress,
+            )
+            for fields in self.pending_events:
+                self.event_log.write(**fields)
+        self.pending_events.clear()
 
     @staticmethod
     def print_header_decorator(func: Callable) -> Callable:
         def _wrapper(self, *args, **kwargs) -> None:  # noqa: ANN001, ANN002, ANN003
-            if not self.log_flag_dict.get(func.__name__, True) or not self.is_write:
+            if not self.log_flag_dict.get(func.__name__, True) or not self.is_open:
                 return None
 
+            start = time.perf_counter()
             if kwargs.get("header") is not None:
                 self.info(AgentLog.header_format.format(header=kwargs.get("header")))
             else:
                 self.info(AgentLog.header_format.format(header=func.__name__))
 
-            return func(self, *args, **kwargs)
+            res = func(self, *args, **kwargs)
+            if self.metrics is not None:
+                self.metrics.observe(phase="log", seconds=time.perf_counter() - start)
+            return res
 
         return _wrapper
 
-    def prepare_log_dir(self) -> None:
-        self.log_dir_path.mkdir(parents=True, exist_ok=True)
-        self.log_month_day_dir.mkdir(parents=True, exist_ok=True)
-        self.log_times.mkdir(parents=True, exist_ok=True)
-
     @print_header_decorator
     def get_info(self, get_info: map, request: str) -> None:
         self.info(get_info)
@@ -148,4 +145,22 @@ class AgentLog(Log):
 
     @print_header_decorator
     def error_message(self, error_message:str) -> None:
-        self.info(error_message)
\ No newline at end of file
+        self.info(error_message)
+
+    @print_header_decorator
+    def metrics_summary(self, summary: dict) -> None:
+        self.info(json.dumps(summary, ensure_ascii=False))
+
+    def event(self, **fields: object) -> None:
+        if self.event_log is not None:
+            self.event_log.write(**fields)
+        elif not self.is_open and self.is_write and self.is_event:
+            self.pending_events.append({"ts": time.time(), **fields})
+
+    def close(self) -> None:
+        if not self.is_open:
+            return
+        if self.event_log is not None:
+            self.event_log.close()
+        super().close()
+        self.is_open = False
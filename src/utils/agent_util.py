@@ -2,8 +2,7 @@ import re
 
 import configparser
 from aiwolf_nlp_common.role import RoleInfo
-from utils.llm.Gemini import Gemini
-from utils.llm.ChatGPT import AIWolfNLPChatGPT
+from utils.llm.backend import Backend, BackendRegistry
 
 import player
 
@@ -25,12 +24,16 @@ def set_role(
     agent.transfer_state(prev_agent=prev_agent)
     return agent
 
-def set_model(config: configparser.ConfigParser, system_instruction:str) -> AIWolfNLPChatGPT | Gemini:
-
-    if config.getboolean("model", "ChatGPT", fallback=False):
-        return AIWolfNLPChatGPT(config=config, system_instruction=system_instruction)
-    
-    return Gemini(config=config, system_instruction=system_instruction)
+def set_model(
+    config: configparser.ConfigParser,
+    system_instruction: str,
+    stable_instruction: str = "",
+) -> Backend:
+    return BackendRegistry.create(
+        config=config,
+        system_instruction=system_instruction,
+        stable_instruction=stable_instruction,
+    )
 
 def agent_name_to_idx(name: str) -> int:
     match = re.search(r"\d+", name)
@@ -41,3 +44,15 @@ def agent_name_to_idx(name: str) -> int:
 
 def agent_idx_to_agent(idx: int) -> str:
     return f"Agent[{idx:0>2d}]"
+
+
+def find_game_id(value: dict) -> str | None:
+    # aiwolf-nlp-common 0.3.5 does not parse a game ID, so read it from the raw packet
+    info = value.get("info") or {}
+    for container in (value, info):
+        for key in ("gameID", "gameId", "game_id"):
+            game_id = container.get(key)
+            if game_id:
+                # the ID becomes a directory name
+                return re.sub(r"[^\w-]", "_", str(game_id))
+    return None
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import websockets
+from aiwolf_nlp_common.client import Client
+
+if TYPE_CHECKING:
+    from websockets.asyncio.client import ClientConnection
+
+
+class AsyncWebSocketClient:
+    encode = "utf-8"
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.socket: ClientConnection | None = None
+
+    async def connect(self) -> None:
+        self.socket = await websockets.connect(self.url, ping_interval=None, max_size=None)
+
+    async def receive(self) -> list[str]:
+        if self.socket is None:
+            raise ConnectionError(self.url, "ゲームサーバに接続されていません")
+
+        resp = await self.socket.recv()
+        resp_str = ""
+        if isinstance(resp, (bytes, bytearray, memoryview)):
+            resp_str = bytes(resp).decode(self.encode)
+        else:
+            resp_str = resp
+        return Client.split_receives(receive=resp_str, include_newline=False)
+
+    async def send(self, req: str) -> None:
+        if self.socket is None:
+            raise ConnectionError(self.url, "ゲームサーバに接続されていません")
+
+        if not req.endswith("\n"):
+            req += "\n"
+        await self.socket.send(req)
+
+    async def close(self) -> None:
+        if self.socket is not None:
+            await self.socket.close()
+            self.socket = None
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import threading
+import time
+
+
+class Deadline:
+    default_margin: float = 0.5
+    min_request_timeout: float = 0.1
+
+    __total_num: int = 0
+    __missed_num: int = 0
+    __lock = threading.Lock()
+
+    def __init__(self, timeout: float, margin: float | None = None) -> None:
+        self.start = time.monotonic()
+        self.timeout = timeout
+        self.margin = margin if margin is not None else Deadline.default_margin
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def remaining(self) -> float | None:
+        if self.timeout <= 0:
+            return None
+        return self.timeout - self.elapsed()
+
+    def budget(self, reserve: float = 0.0) -> float | None:
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return max(remaining - self.margin - reserve, Deadline.min_request_timeout)
+
+    def is_expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def record(self) -> bool:
+        missed = self.is_expired()
+        with Deadline.__lock:
+            Deadline.__total_num += 1
+            if missed:
+                Deadline.__missed_num += 1
+        return missed
+
+    @classmethod
+    def total_num(cls) -> int:
+        return cls.__total_num
+
+    @classmethod
+    def missed_num(cls) -> int:
+        return cls.__missed_num
+
+    @classmethod
+    def miss_rate(cls) -> float:
+        with cls.__lock:
+            if cls.__total_num == 0:
+                return 0.0
+            return cls.__missed_num / cls.__total_num
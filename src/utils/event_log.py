@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import gzip
+import json
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, TextIO
+
+from utils.log import Log
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class EventLog(Log):
+    dir_name = "events"
+    suffix = ".jsonl"
+    compressed_suffix = ".jsonl.gz"
+
+    def __init__(self, game_dir: Path, game: str, agent_name: str, *, compress: bool) -> None:
+        self.game = game
+        self.agent_name = agent_name
+        event_dir = Path.joinpath(game_dir, EventLog.dir_name)
+        Log.prepare_dir(path=event_dir)
+        suffix = EventLog.compressed_suffix if compress else EventLog.suffix
+        super().__init__(
+            filename=Path.joinpath(event_dir, agent_name + suffix),
+            name=f"events.{agent_name}",
+        )
+
+    def write(self, **fields: object) -> None:
+        record = {"ts": time.time(), "game": self.game, "name": self.agent_name}
+        record.update(fields)
+        self.info(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+
+
+class EventReader:
+    def __init__(self, log_dir: Path | str) -> None:
+        self.log_dir = Path(log_dir)
+
+    def files(self, game: str | None = None, name: str | None = None) -> Iterator[Path]:
+        # the directory layout is the index: <game>/events/<name>.jsonl[.gz]
+        root = Path.joinpath(self.log_dir, game) if game is not None else self.log_dir
+        for path in sorted(root.glob(f"**/{EventLog.dir_name}/*.jsonl*")):
+            if name is not None and EventReader.file_name(path=path) != name:
+                continue
+            yield path
+
+    @staticmethod
+    def file_name(path: Path) -> str:
+        return path.name.removesuffix(EventLog.compressed_suffix).removesuffix(EventLog.suffix)
+
+    @staticmethod
+    def open(path: Path) -> TextIO:
+        if path.name.endswith(".gz"):
+            return gzip.open(path, mode="rt", encoding=Log.encoding)
+        return path.open(encoding=Log.encoding)
+
+    def read(  # noqa: PLR0913
+        self,
+        game: str | None = None,
+        name: str | None = None,
+        agent: str | None = None,
+        role: str | None = None,
+        day: int | None = None,
+        request: str | None = None,
+    ) -> Iterator[dict]:
+        filters = {"agent": agent, "role": role, "day": day, "request": request}
+        filters = {key: value for key, value in filters.items() if value is not None}
+        for path in self.files(game=game, name=name):
+            with EventReader.open(path=path) as f:
+                try:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        if all(event.get(key) == value for key, value in filters.items()):
+                            yield event
+                except EOFError:
+                    # a game that is still running or was killed leaves an unterminated gzip file
+                    continue
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import random
+from array import array
+from collections import defaultdict
+from typing import TYPE_CHECKING, TypeVar
+
+from aiwolf_nlp_common import Action
+from aiwolf_nlp_common.role import RoleInfo
+
+from utils import agent_util
+from utils.llm.choice import agent_pattern
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    import numpy as np
+    from aiwolf_nlp_common.protocol.info import Info
+    from aiwolf_nlp_common.protocol.info.result import JudgementResult
+
+    from utils.talk_history import Talk
+
+Score = TypeVar("Score", float, "np.ndarray")
+
+
+def target_scores(request: str, suspicion: Score, claims: Score, known: Score) -> Score:
+    # higher is better; plain arithmetic so one agent and a numpy batch rank alike
+    if Action.is_attack(request=request):
+        # bite the agent that claims a role most often, then the one trusted most
+        return claims * 1000.0 - suspicion
+    # a divined werewolf comes before any amount of suspicion
+    return suspicion + known * 1e6
+
+
+class GameState:
+    # words that turn a mention of an agent into an accusation
+    accusations = ("怪しい", "人狼", "黒", "嘘", "suspicious", "werewolf", "lying", "liar")
+    # words with which a speaker claims a role
+    claim_words: dict[str, str] = {  # noqa: RUF012
+        "占い師": RoleInfo.SEER.value.en,
+        "占い結果": RoleInfo.SEER.value.en,
+        "seer": RoleInfo.SEER.value.en,
+        "divined": RoleInfo.SEER.value.en,
+        "霊媒師": RoleInfo.MEDIUM.value.en,
+        "霊媒結果": RoleInfo.MEDIUM.value.en,
+        "medium": RoleInfo.MEDIUM.value.en,
+        "騎士": RoleInfo.BODYGUARD.value.en,
+        "bodyguard": RoleInfo.BODYGUARD.value.en,
+    }
+    werewolf_result = "WEREWOLF"
+    executed = "executed"
+    attacked = "attacked"
+
+    def __init__(self) -> None:
+        self.day: int = 0
+        # per-agent values indexed by the number in Agent[NN]; slot 0 is unused
+        self.alive = array("B")
+        self.suspicion = array("f")
+        self.claim_num = array("H")
+        self.claims: dict[str, str] = {}
+        self.divine_results: dict[str, str] = {}
+        self.medium_results: dict[str, str] = {}
+        self.votes: dict[int, array] = {}
+        self.deaths: dict[int, list[tuple[str, str]]] = defaultdict(list)
+        self.dead: set[str] = set()
+
+    def slot(self, agent: str) -> int:
+        idx = agent_util.agent_name_to_idx(name=agent)
+        if idx >= len(self.alive):
+            grow = idx + 1 - len(self.alive)
+            self.alive.extend([1] * grow)
+            self.suspicion.extend([0.0] * grow)
+            self.claim_num.extend([0] * grow)
+        return idx
+
+    def update(self, info: Info) -> None:
+        # called only for packets whose info changed, so each block is read once per change
+        self.day = info.day
+        for agent in info.status_map.get_alive_agent_list():
+            self.alive[self.slot(agent=agent)] = 1
+        for agent in info.status_map.get_dead_agent_list():
+            self.alive[self.slot(agent=agent)] = 0
+
+        if info.executed_agent is not None:
+            self.add_death(agent=info.executed_agent, cause=GameState.executed)
+        if info.attacked_agent is not None:
+            self.add_death(agent=info.attacked_agent, cause=GameState.attacked)
+        self.add_result(results=self.divine_results, result=info.divine_result)
+        self.add_result(results=self.medium_results, result=info.medium_result)
+
+        # the server resends the whole vote list, so a day's tally is rebuilt from it
+        days: dict[int, array] = {}
+        for vote in info.vote_list:
+            tally = days.get(vote.day)
+            if tally is None:
+                tally = days[vote.day] = array("H", bytes(2 * len(self.alive)))
+            idx = self.slot(agent=str(vote.target))
+            if idx >= len(tally):
+                tally.extend([0] * (idx + 1 - len(tally)))
+            tally[idx] += 1
+        self.votes.update(days)
+
+    def add_death(self, agent: str, cause: str) -> None:
+        if agent in self.dead:
+            return
+        self.dead.add(agent)
+        self.deaths[self.day].append((agent, cause))
+        self.alive[self.slot(agent=agent)] = 0
+
+    def add_result(self, results: dict[str, str], result: JudgementResult | None) -> None:
+        if result is not None and not result.is_empty():
+            results[result.target] = result.result
+
+    def add_talks(self, talks: Iterable[Talk]) -> None:
+        # fed with the talks TalkHistory.add returns, so each talk is scored exactly once
+        for talk in talks:
+            if talk.skip or talk.over:
+                continue
+            text = talk.text.lower()
+            for word, role in GameState.claim_words.items():
+                if word in text:
+                    self.claims[talk.agent] = role
+                    self.claim_num[self.slot(agent=talk.agent)] += 1
+                    break
+            if not any(word in text for word in GameState.accusations):
+                continue
+            for name in set(agent_pattern.findall(talk.text)):
+                if name != talk.agent:
+                    self.suspicion[self.slot(agent=name)] += 1
+
+    def vote_num(self, agent: str, day: int | None = None) -> int:
+        tally = self.votes.get(self.day if day is None else day)
+        idx = self.slot(agent=agent)
+        return tally[idx] if tally is not None and idx < len(tally) else 0
+
+    def latest_votes(self) -> array | None:
+        return self.votes[max(self.votes)] if self.votes else None
+
+    def choose(self, candidates: list[str], request: str) -> str:
+        # answers without touching the model, so it is safe to call with no time left
+        ranked = [
+            target_scores(
+                request=request,
+                suspicion=self.suspicion[self.slot(agent=agent)],
+                claims=float(self.claim_num[self.slot(agent=agent)]),
+                known=float(self.divine_results.get(agent) == GameState.werewolf_result),
+            )
+            for agent in candidates
+        ]
+        best = max(ranked)
+        return random.choice(  # noqa: S311
+            [agent for agent, rank in zip(candidates, ranked) if rank == best],
+        )
+
+    def summary(self) -> str:
+        # one line per agent, built from the arrays without looking at the talk history
+        votes = self.latest_votes()
+        lines = []
+        for idx in range(1, len(self.alive)):
+            agent = agent_util.agent_idx_to_agent(idx=idx)
+            fields = ["alive" if self.alive[idx] else "dead"]
+            if agent in self.claims:
+                fields.append(f"claim={self.claims[agent]}")
+            if agent in self.divine_results:
+                fields.append(f"divined={self.divine_results[agent]}")
+            if agent in self.medium_results:
+                fields.append(f"medium={self.medium_results[agent]}")
+            if votes is not None and idx < len(votes) and votes[idx] > 0:
+                fields.append(f"votes={votes[idx]}")
+            if self.suspicion[idx] > 0:
+                fields.append(f"suspicion={self.suspicion[idx]:g}")
+            lines.append(f"{agent}: {', '.join(fields)}")
+        return "\n".join(lines)
@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+# orjson decodes packets several times faster; it is optional and json is used without it
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+__all__ = ["loads"]
@@ -1,7 +1,16 @@
 from __future__ import annotations
 
+import dataclasses
 from typing import TYPE_CHECKING
 
+from openai.types import CompletionUsage
+
+from utils.llm.choice import choice_schema
+from utils.llm.event_loop import EventLoop
+from utils.llm.response_cache import ResponseCache
+from utils.llm.stream import StreamCollector, StreamOptions
+from utils.llm.talk_context import TalkContext
+
 from .chatgpt import ChatGPT
 
 if TYPE_CHECKING:
@@ -9,21 +18,175 @@ if TYPE_CHECKING:
 
     from openai.types.chat import ChatCompletion
 
+    from utils.deadline import Deadline
+
 
 class AIWolfNLPChatGPT(ChatGPT):
-    def __init__(self, config: configparser.ConfigParser, system_instruction:str) -> None:
+    def __init__(
+        self,
+        config: configparser.ConfigParser,
+        system_instruction: str,
+        stable_instruction: str = "",
+    ) -> None:
         super().__init__(config=config)
 
+        # the part shared by every game goes first and in its own message, so the request
+        # prefix stays byte-identical and the API can serve it from its prompt cache
+        if stable_instruction:
+            self.add_system_message(content=stable_instruction)
         self.add_system_message(content=system_instruction)
+        self.prefix_num = len(self.messages)
+        self.context = TalkContext(
+            count_tokens=self.get_tokens,
+            max_tokens=config.getint("context", "max_tokens", fallback=0),
+            prefix="\n".join(filter(None, [stable_instruction, system_instruction])),
+        )
+        self.stream_options = StreamOptions.from_config(config=config)
+        self.draft_usage: CompletionUsage | None = None
 
     def set_action_time_out(self, action_timeout: int) -> None:
-        self.client.timeout = action_timeout
+        self.timeout = action_timeout
+
+    def create_comment(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        return EventLoop.run(
+            self.create_comment_async(content=content, deadline=deadline, choices=choices),
+        )
+
+    async def create_comment_async(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        self.add_user_message(content=content)
+        self.context.add_message(content=content)
+        self.fit_context()
+
+        # structured output restricts the answer to one of the choices; it is short, so
+        # it is never streamed
+        response_format = self.make_response_format(choices=choices) if choices else None
+        stream = self.stream_options.enable and response_format is None
+
+        cache_key = self.cache_key(
+            messages=self.messages,
+            stream=stream,
+            response_format=response_format,
+        )
+        timeout = deadline.budget() if deadline is not None else None
+        usage: CompletionUsage | None = None
+        complete = True
+        try:
+            # a replayed request is answered from the cache without calling the API
+            cached = await ResponseCache.get_async(key=cache_key)
+            if cached is not None:
+                comment = cached
+            elif stream:
+                collector = StreamCollector(options=self.stream_options)
+                comment = await collector.collect(
+                    chunks=super().create_stream_async(timeout=timeout),
+                    deadline=deadline,
+                )
+                usage = self.stream_usage
+                # text cut off by the deadline depends on timing, not on the request
+                complete = not collector.timed_out
+            else:
+                response: ChatCompletion = await super().create_comment_async(
+                    timeout=timeout,
+                    response_format=response_format,
+                )
+                comment = response.choices[0].message.content
+                usage = response.usage
+        except BaseException:
+            self.messages.pop()
+            self.context.discard_last()
+            raise
+
+        self.add_assistant_message(content=comment)
+        self.context.add_message(content=comment)
+        if cached is not None:
+            self.context.report_usage(prompt_tokens=0, completion_tokens=0)
+            return comment
+
+        self.report_usage(usage=usage)
+        if complete:
+            ResponseCache.put_async(key=cache_key, model=self.model, response=comment)
+
+        return comment
+
+    @classmethod
+    def make_response_format(cls, choices: list[str]) -> dict:
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "choice",
+                "strict": True,
+                "schema": {**choice_schema(choices=choices), "additionalProperties": False},
+            },
+        }
+
+    def cache_key(
+        self,
+        messages: list,
+        *,
+        stream: bool,
+        response_format: dict | None = None,
+    ) -> str:
+        params = dataclasses.asdict(self.optional_params)
+        if stream:
+            # the stream limits change where the text is cut
+            params["stream"] = dataclasses.asdict(self.stream_options)
+        if response_format is not None:
+            params["response_format"] = response_format
+        return ResponseCache.make_key(model=self.model, params=params, messages=messages)
+
+    def report_usage(self, usage: CompletionUsage | None) -> None:
+        # missing when a stream was cut off before the final chunk
+        if usage is None:
+            return
+        details = usage.prompt_tokens_details
+        self.context.report_usage(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=(details.cached_tokens or 0) if details is not None else 0,
+        )
+
+    async def draft_async(self, content: str) -> str:
+        # generate on a copy of the conversation; nothing is kept until commit() is called
+        messages = [*self.messages, self.make_user_message_param(content=content)]
+        cache_key = self.cache_key(messages=messages, stream=False)
+        cached = await ResponseCache.get_async(key=cache_key)
+        if cached is not None:
+            self.draft_usage = CompletionUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+            return cached
+
+        response: ChatCompletion = await super().create_comment_async(messages=messages)
+        self.draft_usage = response.usage
+        comment = response.choices[0].message.content
+        ResponseCache.put_async(key=cache_key, model=self.model, response=comment)
+        return comment
 
-    def create_comment(self, content: str) -> str:
+    def commit(self, content: str, comment: str) -> None:
         self.add_user_message(content=content)
+        self.context.add_message(content=content)
+        self.fit_context()
 
-        response: ChatCompletion = super().create_comment()
+        self.add_assistant_message(content=comment)
+        self.context.add_message(content=comment)
+        self.report_usage(usage=self.draft_usage)
+        self.draft_usage = None
 
-        self.add_assistant_message(content=response.choices[0].message.content)
+    def rollback(self) -> None:
+        if len(self.messages) >= self.prefix_num + 2:
+            del self.messages[-2:]
+            self.context.discard_last()
+            self.context.discard_last()
 
-        return response.choices[0].message.content
+    def fit_context(self) -> None:
+        drop_num = self.context.fit()
+        if drop_num > 0:
+            del self.messages[self.prefix_num : self.prefix_num + drop_num]
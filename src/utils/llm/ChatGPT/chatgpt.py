@@ -1,19 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import configparser
 import os
 from dataclasses import asdict
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+import openai
 import tiktoken
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from utils.llm.client_pool import ClientPool
+from utils.llm.event_loop import EventLoop
+from utils.llm.gateway import RequestGateway
 
 from .message_role import MessageRole
 from .optional_params import OptionalParams
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+
+    from openai.types import CompletionUsage
     from openai.types.chat import (
         ChatCompletion,
         ChatCompletionAssistantMessageParam,
@@ -28,12 +37,29 @@ if TYPE_CHECKING:
 class ChatGPT:
     # init file key
     __config_key = "params"
+    # [path] entry of the main config that points at the init file
+    config_path_key = "chatgpt_config"
+    config_name = "ChatGPT"
+    # used when tiktoken does not know the model, e.g. one served by a local server
+    default_encoding = "cl100k_base"
+    default_base_url: str | None = None
+    # throttling and transient server errors; the gateway retries these within the budget
+    retryable_errors: tuple[type[BaseException], ...] = (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
 
     def __init__(self, config: configparser.ConfigParser) -> None:
         self.load_api_key(config=config)
         chatgpt_config = self.read_config(config=config)
 
         self.model: str = chatgpt_config.get(self.__config_key, "model")
+        base_url = chatgpt_config.get(
+            self.__config_key,
+            "base_url",
+            fallback=self.default_base_url,
+        )
 
         self.optional_params: OptionalParams = OptionalParams(
             frequency_penalty=chatgpt_config.getfloat(
@@ -65,16 +91,46 @@ class ChatGPT:
             | ChatCompletionFunctionMessageParam
             | ChatCompletionAssistantMessageParam
         ] = []
-        self.token_model = tiktoken.encoding_for_model(model_name=self.model)
+        self.timeout: float | None = None
+        # usage of the last streamed completion, sent by the API after the final chunk
+        self.stream_usage: CompletionUsage | None = None
+
+        # the tokenizer and the HTTP client are shared by every game in this process
+        self.token_model = ClientPool.get(
+            key=("tiktoken", self.model),
+            factory=lambda: self.get_encoding(model=self.model),
+        )
+        api_key = self.get_api_key(chatgpt_config=chatgpt_config)
+        # requests sharing a key share its rate limit in the gateway
+        self.client_key = ("openai", api_key, base_url)
+        self.client = ClientPool.get(
+            key=self.client_key,
+            factory=lambda: AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=RequestGateway.client_retries(default=openai.DEFAULT_MAX_RETRIES),
+            ),
+        )
 
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    @classmethod
+    def get_encoding(cls, model: str) -> tiktoken.Encoding:
+        try:
+            return tiktoken.encoding_for_model(model_name=model)
+        except KeyError:
+            return tiktoken.get_encoding(cls.default_encoding)
+
+    def get_api_key(self, chatgpt_config: configparser.ConfigParser) -> str | None:  # noqa: ARG002
+        return os.environ.get("OPENAI_API_KEY")
 
     @classmethod
     def read_config(cls, config: configparser.ConfigParser) -> configparser.ConfigParser:
-        chatgpt_config_path: str = config.get("path", "chatgpt_config")
+        chatgpt_config_path: str = config.get("path", cls.config_path_key)
 
         if not Path(chatgpt_config_path).is_file():
-            raise FileNotFoundError(chatgpt_config_path, "ChatGPTの設定ファイルが見つかりません")
+            raise FileNotFoundError(
+                chatgpt_config_path,
+                f"{cls.config_name}の設定ファイルが見つかりません",
+            )
 
         chatgpt_config = configparser.ConfigParser()
         chatgpt_config.read(chatgpt_config_path, encoding="utf-8")
@@ -171,11 +227,23 @@ class ChatGPT:
     def add_function_message(self, content: str) -> None:
         self.add_message(message=self.make_function_message_param(content=content))
 
-    def create_comment(self) -> ChatCompletion:
+    def create_comment(self, timeout: float | None = None) -> ChatCompletion:
+        return EventLoop.run(self.create_comment_async(timeout=timeout))
+
+    def make_chatgpt_args(
+        self,
+        timeout: float | None = None,
+        messages: list | None = None,
+        response_format: dict | None = None,
+    ) -> dict:
         chatgpt_args = {
             "model": self.model,
-            "messages": self.messages,
+            "messages": messages if messages is not None else self.messages,
         }
+        if timeout is not None:
+            chatgpt_args["timeout"] = timeout
+        if response_format is not None:
+            chatgpt_args["response_format"] = response_format
 
         chatgpt_args.update(
             {
@@ -185,8 +253,62 @@ class ChatGPT:
             },
         )
 
-        return self.client.chat.completions.create(**chatgpt_args)
+        return chatgpt_args
+
+    async def create_comment_async(
+        self,
+        timeout: float | None = None,
+        messages: list | None = None,
+        response_format: dict | None = None,
+    ) -> ChatCompletion:
+        if timeout is None:
+            timeout = self.timeout
+
+        chatgpt_args = self.make_chatgpt_args(
+            timeout=timeout,
+            messages=messages,
+            response_format=response_format,
+        )
+
+        # the client timeout applies per attempt, so bound the retries as a whole as well
+        return await asyncio.wait_for(
+            RequestGateway.call(
+                lambda: self.client.chat.completions.create(**chatgpt_args),
+                key=self.client_key,
+                timeout=timeout,
+                retryable=self.retryable_errors,
+            ),
+            timeout=timeout,
+        )
+
+    async def create_stream_async(
+        self,
+        timeout: float | None = None,
+    ) -> AsyncGenerator[str, None]:
+        if timeout is None:
+            timeout = self.timeout
+
+        chatgpt_args = self.make_chatgpt_args(timeout=timeout)
+        chatgpt_args["stream"] = True
+        chatgpt_args["stream_options"] = {"include_usage": True}
+
+        self.stream_usage = None
+        async with RequestGateway.slot(key=self.client_key, timeout=timeout):
+            # only opening the stream is retried; a stream that broke off is not replayed
+            stream = await RequestGateway.retry(
+                lambda: self.client.chat.completions.create(**chatgpt_args),
+                timeout=timeout,
+                retryable=self.retryable_errors,
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        self.stream_usage = chunk.usage
+                    if len(chunk.choices) > 0 and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
 
     def close(self) -> None:
-        if hasattr(self, "client"):
-            self.client.close()
+        # the pooled client outlives the game; ClientPool closes it when the process exits
+        self.messages.clear()
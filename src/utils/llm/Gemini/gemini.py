@@ -1,25 +1,112 @@
 from __future__ import annotations
 
+import asyncio
 import configparser
+import dataclasses
+import datetime
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 import google.generativeai as genai
 from dotenv import load_dotenv
-from google.generativeai.types import GenerateContentResponse, GenerationConfig
+from google.api_core import exceptions
+from google.generativeai import caching, protos
+from google.generativeai.types import (
+    AsyncGenerateContentResponse,
+    GenerationConfig,
+    content_types,
+)
+
+from utils.llm.choice import choice_schema
+from utils.llm.client_pool import ClientPool
+from utils.llm.event_loop import EventLoop
+from utils.llm.gateway import RequestGateway
+from utils.llm.response_cache import ResponseCache
+from utils.llm.stream import StreamCollector, StreamOptions
+from utils.llm.talk_context import TalkContext
+
+from .message_role import MessageRole
 
 if TYPE_CHECKING:
-    from google.generativeai.types import content_types
+    from collections.abc import AsyncGenerator
+
+    from utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class InstructionCache:
+    # an explicit cache of the stable instruction, shared by every agent of the process
+    def __init__(self, model: str, instruction: str, ttl: int) -> None:
+        self.model = model
+        self.instruction = instruction
+        self.ttl = ttl
+        self.content: caching.CachedContent | None = None
+        self.expire: float = 0.0
+        self.failed: bool = False
+        self.lock = threading.Lock()
+
+    def get(self) -> caching.CachedContent | None:
+        with self.lock:
+            if self.failed:
+                return None
+            now = time.monotonic()
+            # extend the ttl once half of it has passed, so no game starts on a cache that
+            # expires before the game ends
+            if self.content is not None and now > self.expire - self.ttl / 2:
+                try:
+                    self.content.update(ttl=datetime.timedelta(seconds=self.ttl))
+                    self.expire = now + self.ttl
+                except Exception:
+                    logger.warning("Geminiのキャッシュを延長できません", exc_info=True)
+                    self.content = None
+            if self.content is None:
+                try:
+                    self.content = caching.CachedContent.create(
+                        model=self.model,
+                        system_instruction=self.instruction,
+                        ttl=datetime.timedelta(seconds=self.ttl),
+                    )
+                    self.expire = now + self.ttl
+                except Exception:
+                    # e.g. the instruction is shorter than the model's minimum cache size;
+                    # that does not change, so it is not tried again
+                    logger.warning("Geminiのキャッシュを作成できません", exc_info=True)
+                    self.failed = True
+            return self.content
+
+    def close(self) -> None:
+        with self.lock:
+            content = self.content
+            self.content = None
+        if content is None:
+            return
+        try:
+            content.delete()
+        except Exception:
+            logger.warning("Geminiのキャッシュを削除できません", exc_info=True)
 
 
 class Gemini:
     __config_key = "params"
+    __cache_key = "cache"
+    # throttling and transient server errors; the gateway retries these within the budget
+    retryable_errors: tuple[type[BaseException], ...] = (
+        exceptions.ResourceExhausted,
+        exceptions.TooManyRequests,
+        exceptions.ServiceUnavailable,
+        exceptions.InternalServerError,
+    )
 
     def __init__(
         self,
         config: configparser.ConfigParser,
-        system_instruction: content_types.ContentType = None,
+        system_instruction: str = "",
+        stable_instruction: str = "",
     ) -> None:
         self.load_api_key(config=config)
         gemini_config = self.read_config(config=config)
@@ -53,12 +140,62 @@ class Gemini:
             ),
         )
 
-        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-        self.client = genai.GenerativeModel(
-            model_name=self.model,
+        # configure only once per key; reconfiguring drops genai's cached gRPC clients
+        api_key = os.environ.get("GEMINI_API_KEY")
+        # requests sharing a key share its rate limit in the gateway
+        self.client_key = ("gemini", api_key)
+        ClientPool.get(key=self.client_key, factory=lambda: self.configure(api_key=api_key))
+        # the part shared by every game comes first so the implicit prefix cache can match it
+        instruction = "\n".join(filter(None, [stable_instruction, system_instruction]))
+        self.instruction = instruction
+        self.client, history = self.create_model(
+            stable_instruction=stable_instruction,
             system_instruction=system_instruction,
+            gemini_config=gemini_config,
+        )
+        self.chat = self.client.start_chat(history=history)
+        # leading history entries that carry the instruction and are never trimmed
+        self.prefix_num = len(history)
+        self.context = TalkContext(
+            count_tokens=self.get_tokens,
+            max_tokens=config.getint("context", "max_tokens", fallback=0),
+            prefix=instruction,
         )
-        self.chat = self.client.start_chat(history=[])
+        self.stream_options = StreamOptions.from_config(config=config)
+        self.stream_usage: protos.GenerateContentResponse.UsageMetadata | None = None
+        self.stream_timed_out: bool = False
+        self.timeout: float | None = None
+        self.draft_usage: protos.GenerateContentResponse.UsageMetadata | None = None
+
+    def create_model(
+        self,
+        stable_instruction: str,
+        system_instruction: str,
+        gemini_config: configparser.ConfigParser,
+    ) -> tuple[genai.GenerativeModel, list[protos.Content]]:
+        if stable_instruction and gemini_config.getboolean(
+            self.__cache_key,
+            "enable",
+            fallback=False,
+        ):
+            # only the part shared by every agent is cached; a model built from a cache
+            # cannot take its own system instruction, so the rest opens the history instead
+            cache = ClientPool.get(
+                key=("gemini-cache", self.model, stable_instruction),
+                factory=lambda: InstructionCache(
+                    model=self.model,
+                    instruction=stable_instruction,
+                    ttl=gemini_config.getint(self.__cache_key, "ttl", fallback=3600),
+                ),
+            )
+            cached_content = cache.get()
+            if cached_content is not None:
+                model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+                if not system_instruction:
+                    return model, []
+                return model, [self.make_user_content(content=system_instruction)]
+        instruction = "\n".join(filter(None, [stable_instruction, system_instruction]))
+        return genai.GenerativeModel(model_name=self.model, system_instruction=instruction), []
 
     @classmethod
     def read_config(cls, config: configparser.ConfigParser) -> configparser.ConfigParser:
@@ -72,6 +209,11 @@ class Gemini:
 
         return gemini_config
 
+    @classmethod
+    def configure(cls, api_key: str | None) -> str | None:
+        genai.configure(api_key=api_key)
+        return api_key
+
     @classmethod
     def load_api_key(cls, config: configparser.ConfigParser) -> None:
         api_key_path: str = config.get("path", "api_key_path")
@@ -81,10 +223,227 @@ class Gemini:
 
         load_dotenv(api_key_path)
 
-    def create_comment(self, content: content_types.ContentType) -> str:
-        response: GenerateContentResponse = self.chat.send_message(
-            content=content,
-            generation_config=self.optional_params,
+    def set_action_time_out(self, action_timeout: int) -> None:
+        self.timeout = action_timeout
+
+    def get_tokens(self, text: str) -> int:
+        # no local tokenizer is available for Gemini; one token per character is an upper bound
+        # for Japanese text and keeps the budget check free of API calls
+        return len(text)
+
+    def create_comment(
+        self,
+        content: content_types.ContentType,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        return EventLoop.run(
+            self.create_comment_async(content=content, deadline=deadline, choices=choices),
+        )
+
+    async def create_comment_async(
+        self,
+        content: content_types.ContentType,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        self.context.add_message(content=str(content))
+        self.fit_context()
+
+        # structured output restricts the answer to one of the choices; it is short, so
+        # it is never streamed
+        generation_config = self.optional_params
+        if choices:
+            generation_config = dataclasses.replace(
+                self.optional_params,
+                response_mime_type="application/json",
+                response_schema=choice_schema(choices=choices),
+            )
+        stream = self.stream_options.enable and not choices
+
+        cache_key = self.cache_key(
+            contents=[*self.chat.history, content],
+            stream=stream,
+            generation_config=generation_config,
+        )
+        timeout = deadline.budget() if deadline is not None else self.timeout
+        usage: protos.GenerateContentResponse.UsageMetadata | None = None
+        complete = True
+        try:
+            # a replayed request is answered from the cache without calling the API
+            cached = await ResponseCache.get_async(key=cache_key)
+            if cached is not None:
+                comment = cached
+            elif stream:
+                comment = await self.create_stream_comment_async(content=content, deadline=deadline)
+                usage = self.stream_usage
+                # text cut off by the deadline depends on timing, not on the request
+                complete = not self.stream_timed_out
+            else:
+                response: AsyncGenerateContentResponse = await asyncio.wait_for(
+                    RequestGateway.call(
+                        lambda: self.chat.send_message_async(
+                            content=content,
+                            generation_config=generation_config,
+                            request_options={"timeout": timeout} if timeout is not None else None,
+                        ),
+                        key=self.client_key,
+                        timeout=timeout,
+                        retryable=self.retryable_errors,
+                    ),
+                    timeout=timeout,
+                )
+                comment = response.text
+                usage = response.usage_metadata
+        except BaseException:
+            self.context.discard_last()
+            raise
+
+        self.context.add_message(content=comment)
+        if cached is not None:
+            self.chat.history = [
+                *self.chat.history,
+                self.make_user_content(content=content),
+                {"role": MessageRole.MODEL.value, "parts": [comment]},
+            ]
+            self.context.report_usage(prompt_tokens=0, completion_tokens=0)
+            return comment
+
+        self.report_usage(usage=usage)
+        if complete:
+            ResponseCache.put_async(key=cache_key, model=self.model, response=comment)
+
+        return comment
+
+    def cache_key(
+        self,
+        contents: list,
+        *,
+        stream: bool,
+        generation_config: GenerationConfig | None = None,
+    ) -> str:
+        params = dataclasses.asdict(generation_config or self.optional_params)
+        if stream:
+            # the stream limits change where the text is cut
+            params["stream"] = dataclasses.asdict(self.stream_options)
+        # history holds both protos and dicts; convert them to one form before hashing
+        messages = [self.instruction]
+        for message in contents:
+            user_content = self.make_user_content(content=message)
+            messages.append(type(user_content).to_dict(user_content))
+        return ResponseCache.make_key(model=self.model, params=params, messages=messages)
+
+    def report_usage(self, usage: protos.GenerateContentResponse.UsageMetadata | None) -> None:
+        # missing when a stream was cut off before the final chunk
+        if usage is None:
+            return
+        self.context.report_usage(
+            prompt_tokens=usage.prompt_token_count,
+            completion_tokens=usage.candidates_token_count,
+            cached_tokens=usage.cached_content_token_count,
         )
 
+    async def draft_async(self, content: content_types.ContentType) -> str:
+        # generate on a copy of the history; nothing is kept until commit() is called
+        contents = [*self.chat.history, self.make_user_content(content=content)]
+        cache_key = self.cache_key(contents=contents, stream=False)
+        cached = await ResponseCache.get_async(key=cache_key)
+        if cached is not None:
+            self.draft_usage = protos.GenerateContentResponse.UsageMetadata()
+            return cached
+
+        response: AsyncGenerateContentResponse = await RequestGateway.call(
+            lambda: self.client.generate_content_async(
+                contents=contents,
+                generation_config=self.optional_params,
+            ),
+            key=self.client_key,
+            retryable=self.retryable_errors,
+        )
+        self.draft_usage = response.usage_metadata
+        ResponseCache.put_async(key=cache_key, model=self.model, response=response.text)
         return response.text
+
+    def commit(self, content: content_types.ContentType, comment: str) -> None:
+        self.context.add_message(content=str(content))
+        self.fit_context()
+
+        self.chat.history = [
+            *self.chat.history,
+            self.make_user_content(content=content),
+            {"role": MessageRole.MODEL.value, "parts": [comment]},
+        ]
+        self.context.add_message(content=comment)
+        self.report_usage(usage=self.draft_usage)
+        self.draft_usage = None
+
+    def rollback(self) -> None:
+        if len(self.chat.history) >= self.prefix_num + 2:
+            self.chat.history = self.chat.history[:-2]
+            self.context.discard_last()
+            self.context.discard_last()
+
+    def fit_context(self) -> None:
+        drop_num = self.context.fit()
+        if drop_num > 0:
+            del self.chat.history[self.prefix_num : self.prefix_num + drop_num]
+
+    @classmethod
+    def make_user_content(cls, content: content_types.ContentType) -> protos.Content:
+        user_content = content_types.to_content(content)
+        if not user_content.role:
+            user_content.role = MessageRole.USER.value
+        return user_content
+
+    async def create_stream_comment_async(
+        self,
+        content: content_types.ContentType,
+        deadline: Deadline | None = None,
+    ) -> str:
+        history = self.chat.history
+        user_content = self.make_user_content(content=content)
+
+        collector = StreamCollector(options=self.stream_options)
+        comment = await collector.collect(
+            chunks=self.create_stream_async(
+                contents=[*history, user_content],
+                timeout=deadline.budget() if deadline is not None else None,
+            ),
+            deadline=deadline,
+        )
+        self.stream_timed_out = collector.timed_out
+
+        # a chat session cannot record a stream that was cut short, so append the turn here
+        self.chat.history = [
+            *history,
+            user_content,
+            {"role": MessageRole.MODEL.value, "parts": [comment]},
+        ]
+        return comment
+
+    async def create_stream_async(
+        self,
+        contents: content_types.ContentsType,
+        timeout: float | None = None,
+    ) -> AsyncGenerator[str, None]:
+        self.stream_usage = None
+        async with RequestGateway.slot(key=self.client_key, timeout=timeout):
+            # only opening the stream is retried; a stream that broke off is not replayed
+            response: AsyncGenerateContentResponse = await RequestGateway.retry(
+                lambda: self.client.generate_content_async(
+                    contents=contents,
+                    generation_config=self.optional_params,
+                    stream=True,
+                    request_options={"timeout": timeout} if timeout is not None else None,
+                ),
+                timeout=timeout,
+                retryable=self.retryable_errors,
+            )
+            async for chunk in response:
+                if chunk.parts:
+                    yield chunk.text
+        self.stream_usage = response.usage_metadata
+
+    def close(self) -> None:
+        # the configured genai client is shared; only this game's conversation is dropped
+        self.chat.history = []
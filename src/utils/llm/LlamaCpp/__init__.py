@@ -0,0 +1 @@
+from .llama_cpp_llm import LlamaCppLLM
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import configparser
+import contextlib
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from llama_cpp import Llama
+
+from utils.llm.choice import choice_schema
+from utils.llm.client_pool import ClientPool
+from utils.llm.event_loop import EventLoop
+from utils.llm.stream import StreamCollector, StreamOptions
+from utils.llm.talk_context import TalkContext
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+
+    from utils.deadline import Deadline
+
+
+class LlamaCppModel:
+    def __init__(self, llama: Llama) -> None:
+        self.llama = llama
+        # a llama.cpp context is not thread-safe, so agents sharing the model take turns
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        with self.lock:
+            self.llama.close()
+
+
+class LlamaCppLLM:
+    __config_key = "params"
+
+    def __init__(
+        self,
+        config: configparser.ConfigParser,
+        system_instruction: str = "",
+        stable_instruction: str = "",
+    ) -> None:
+        llama_config = self.read_config(config=config)
+
+        model_path = llama_config.get(self.__config_key, "model_path")
+        if not Path(model_path).is_file():
+            raise FileNotFoundError(model_path, "モデルのファイルが見つかりません")
+        self.model: str = Path(model_path).name
+        n_ctx = llama_config.getint(self.__config_key, "n_ctx", fallback=4096)
+        n_threads = llama_config.getint(self.__config_key, "n_threads", fallback=None)
+
+        params = {
+            "max_tokens": llama_config.getint(self.__config_key, "max_tokens", fallback=256),
+            "temperature": llama_config.getfloat(self.__config_key, "temperature", fallback=None),
+            "top_p": llama_config.getfloat(self.__config_key, "top_p", fallback=None),
+            "top_k": llama_config.getint(self.__config_key, "top_k", fallback=None),
+            "seed": llama_config.getint(self.__config_key, "seed", fallback=None),
+        }
+        self.params = {key: value for key, value in params.items() if value is not None}
+
+        # loading the weights takes seconds and memory, so every game in the process shares them
+        self.engine: LlamaCppModel = ClientPool.get(
+            key=("llama_cpp", model_path, n_ctx, n_threads),
+            factory=lambda: LlamaCppModel(
+                llama=Llama(
+                    model_path=model_path,
+                    n_ctx=n_ctx,
+                    n_threads=n_threads,
+                    verbose=False,
+                ),
+            ),
+        )
+
+        instruction = "\n".join(filter(None, [stable_instruction, system_instruction]))
+        self.messages: list[dict[str, str]] = [{"role": "system", "content": instruction}]
+        self.timeout: float | None = None
+        self.context = TalkContext(
+            count_tokens=self.get_tokens,
+            max_tokens=config.getint("context", "max_tokens", fallback=0),
+            prefix=instruction,
+        )
+        self.stream_options = StreamOptions.from_config(config=config)
+
+    @classmethod
+    def read_config(cls, config: configparser.ConfigParser) -> configparser.ConfigParser:
+        llama_config_path: str = config.get("path", "llama_cpp_config")
+
+        if not Path(llama_config_path).is_file():
+            raise FileNotFoundError(llama_config_path, "llama.cppの設定ファイルが見つかりません")
+
+        llama_config = configparser.ConfigParser()
+        llama_config.read(llama_config_path, encoding="utf-8")
+
+        return llama_config
+
+    def set_action_time_out(self, action_timeout: int) -> None:
+        self.timeout = action_timeout
+
+    def get_tokens(self, text: str) -> int:
+        return len(self.engine.llama.tokenize(text.encode("utf-8"), add_bos=False))
+
+    def create_comment(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        return EventLoop.run(
+            self.create_comment_async(content=content, deadline=deadline, choices=choices),
+        )
+
+    async def create_comment_async(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        self.messages.append({"role": "user", "content": content})
+        self.context.add_message(content=content)
+        self.fit_context()
+
+        # llama.cpp turns the schema into a grammar, so the answer is always one of the choices
+        response_format = (
+            {"type": "json_object", "schema": choice_schema(choices=choices)} if choices else None
+        )
+        timeout = deadline.budget() if deadline is not None else self.timeout
+        try:
+            if self.stream_options.enable and response_format is None:
+                comment = await StreamCollector(options=self.stream_options).collect(
+                    chunks=self.generate_async(messages=list(self.messages)),
+                    deadline=deadline,
+                )
+            else:
+                comment = await asyncio.wait_for(
+                    self.collect_async(
+                        messages=list(self.messages),
+                        response_format=response_format,
+                    ),
+                    timeout=timeout,
+                )
+        except BaseException:
+            self.messages.pop()
+            self.context.discard_last()
+            raise
+
+        self.messages.append({"role": "assistant", "content": comment})
+        self.context.add_message(content=comment)
+
+        return comment
+
+    async def collect_async(
+        self,
+        messages: list[dict[str, str]],
+        response_format: dict | None = None,
+    ) -> str:
+        chunks = self.generate_async(messages=messages, response_format=response_format)
+        return "".join([chunk async for chunk in chunks])
+
+    async def generate_async(
+        self,
+        messages: list[dict[str, str]],
+        response_format: dict | None = None,
+    ) -> AsyncGenerator[str, None]:
+        # generation runs on its own thread and hands tokens over as they are sampled, so the
+        # event loop keeps serving the other agents while the CPU is busy
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue[str | BaseException | None] = asyncio.Queue()
+        stop = threading.Event()
+
+        def put(item: str | BaseException | None) -> None:
+            # the loop may already be closed when a cancelled generation winds down
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+        def run() -> None:
+            try:
+                with self.engine.lock:
+                    for chunk in self.engine.llama.create_chat_completion(
+                        messages=messages,
+                        stream=True,
+                        response_format=response_format,
+                        **self.params,
+                    ):
+                        if stop.is_set():
+                            break
+                        text = chunk["choices"][0]["delta"].get("content")
+                        if text:
+                            put(text)
+            except Exception as e:  # noqa: BLE001
+                put(e)
+            finally:
+                put(None)
+
+        threading.Thread(target=run, name="llama-cpp", daemon=True).start()
+        try:
+            while (item := await chunks.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # a timed out or cut off generation stops at the next token and frees the model
+            stop.set()
+
+    async def draft_async(self, content: str) -> str:
+        # generate on a copy of the conversation; nothing is kept until commit() is called
+        return await self.collect_async(
+            messages=[*self.messages, {"role": "user", "content": content}],
+        )
+
+    def commit(self, content: str, comment: str) -> None:
+        self.messages.append({"role": "user", "content": content})
+        self.context.add_message(content=content)
+        self.fit_context()
+
+        self.messages.append({"role": "assistant", "content": comment})
+        self.context.add_message(content=comment)
+
+    def rollback(self) -> None:
+        # the system message stays
+        if len(self.messages) > 2:  # noqa: PLR2004
+            del self.messages[-2:]
+            self.context.discard_last()
+            self.context.discard_last()
+
+    def fit_context(self) -> None:
+        drop_num = self.context.fit()
+        if drop_num > 0:
+            del self.messages[1 : 1 + drop_num]
+
+    def close(self) -> None:
+        # the shared model outlives the game; ClientPool closes it when the process exits
+        self.messages.clear()
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import tiktoken
+
+from utils.llm.ChatGPT import AIWolfNLPChatGPT
+
+if TYPE_CHECKING:
+    import configparser
+
+
+class LocalChatGPT(AIWolfNLPChatGPT):
+    # any server that implements the OpenAI chat completions API (vLLM, llama.cpp, Ollama, ...)
+    config_path_key = "local_config"
+    config_name = "ローカルサーバ"
+    default_base_url = "http://127.0.0.1:8000/v1"
+
+    @classmethod
+    def load_api_key(cls, config: configparser.ConfigParser) -> None:
+        # local servers usually accept any key, so the .env file is optional here
+        if Path(config.get("path", "api_key_path", fallback="")).is_file():
+            super().load_api_key(config=config)
+
+    def get_api_key(self, chatgpt_config: configparser.ConfigParser) -> str | None:
+        # the OpenAI client refuses to start without a key
+        return (
+            chatgpt_config.get("params", "api_key", fallback=None)
+            or os.environ.get("LOCAL_API_KEY")
+            or "EMPTY"
+        )
+
+    @classmethod
+    def get_encoding(cls, model: str) -> tiktoken.Encoding | None:
+        # tiktoken downloads its vocabulary on first use, which an offline machine cannot do
+        try:
+            return super().get_encoding(model=model)
+        except OSError:
+            return None
+
+    def get_tokens(self, text: str) -> int:
+        if self.token_model is None:
+            # one token per character is an upper bound for Japanese text, as for Gemini
+            return len(text)
+        return super().get_tokens(text=text)
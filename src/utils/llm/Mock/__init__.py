@@ -0,0 +1 @@
+from .mock import MockLLM
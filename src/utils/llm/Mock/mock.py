@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import configparser
+import json
+import random
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from utils.llm.event_loop import EventLoop
+from utils.llm.gateway import RequestGateway
+from utils.llm.stream import StreamCollector, StreamOptions
+from utils.llm.talk_context import TalkContext
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+
+    from utils.deadline import Deadline
+
+
+class MockRateLimitError(Exception):
+    pass
+
+
+class MockLLM:
+    __config_key = "params"
+    retryable_errors: tuple[type[BaseException], ...] = (MockRateLimitError,)
+
+    comments = (
+        "おはようございます。今日もよろしくお願いします。",
+        "まだ情報が少ないので、皆さんの意見を聞きたいです。",
+        "私は村人です。怪しい人がいれば教えてください。",
+        "昨日の発言を見ると、少し気になる人がいます。",
+        "占い師の方は結果を教えてもらえますか？",
+        "投票先はもう少し考えてから決めます。",
+    )
+
+    def __init__(
+        self,
+        config: configparser.ConfigParser,
+        system_instruction: str = "",
+        stable_instruction: str = "",
+    ) -> None:
+        mock_config = self.read_config(config=config)
+
+        self.model: str = "mock"
+        self.latency: float = mock_config.getfloat(self.__config_key, "latency", fallback=0.0)
+        self.jitter: float = mock_config.getfloat(self.__config_key, "jitter", fallback=0.0)
+        # share of requests rejected as if the API throttled them
+        self.error_rate: float = mock_config.getfloat(
+            self.__config_key,
+            "error_rate",
+            fallback=0.0,
+        )
+        seed = mock_config.getint(self.__config_key, "seed", fallback=None)
+        instruction = "\n".join(filter(None, [stable_instruction, system_instruction]))
+        # seeding with the system instruction gives every agent its own reproducible sequence
+        self.random = random.Random(f"{seed}:{instruction}" if seed is not None else None)  # noqa: S311
+
+        self.history: list[str] = []
+        self.timeout: float | None = None
+        self.context = TalkContext(
+            count_tokens=self.get_tokens,
+            max_tokens=config.getint("context", "max_tokens", fallback=0),
+            prefix=instruction,
+        )
+        self.stream_options = StreamOptions.from_config(config=config)
+
+    @classmethod
+    def read_config(cls, config: configparser.ConfigParser) -> configparser.ConfigParser:
+        mock_config_path: str = config.get("path", "mock_config")
+
+        if not Path(mock_config_path).is_file():
+            raise FileNotFoundError(mock_config_path, "Mockの設定ファイルが見つかりません")
+
+        mock_config = configparser.ConfigParser()
+        mock_config.read(mock_config_path, encoding="utf-8")
+
+        return mock_config
+
+    def set_action_time_out(self, action_timeout: int) -> None:
+        self.timeout = action_timeout
+
+    def get_tokens(self, text: str) -> int:
+        return len(text)
+
+    def next_latency(self) -> float:
+        return max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0.0)
+
+    def create_comment(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        return EventLoop.run(
+            self.create_comment_async(content=content, deadline=deadline, choices=choices),
+        )
+
+    async def create_comment_async(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str:
+        self.context.add_message(content=content)
+        self.fit_context()
+
+        timeout = deadline.budget() if deadline is not None else self.timeout
+        try:
+            if choices:
+                # answers in the same shape as a structured output call
+                await asyncio.wait_for(self.generate_async(timeout=timeout), timeout=timeout)
+                comment = json.dumps({"target": self.random.choice(choices)})
+            elif self.stream_options.enable:
+                comment = await StreamCollector(options=self.stream_options).collect(
+                    chunks=self.create_stream_async(),
+                    deadline=deadline,
+                )
+            else:
+                comment = await asyncio.wait_for(
+                    self.generate_async(timeout=timeout),
+                    timeout=timeout,
+                )
+        except BaseException:
+            self.context.discard_last()
+            raise
+
+        self.history.extend([content, comment])
+        self.context.add_message(content=comment)
+
+        return comment
+
+    async def generate_async(self, timeout: float | None = None) -> str:
+        # goes through the gateway like a real API call so scheduling can be measured offline
+        await RequestGateway.call(
+            self.request_async,
+            key=("mock",),
+            timeout=timeout,
+            retryable=self.retryable_errors,
+        )
+        return self.random.choice(MockLLM.comments)
+
+    async def request_async(self) -> None:
+        await asyncio.sleep(self.next_latency())
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            raise MockRateLimitError
+
+    async def create_stream_async(self) -> AsyncGenerator[str, None]:
+        comment = self.random.choice(MockLLM.comments)
+        chunk_latency = self.next_latency() / len(comment)
+        async with RequestGateway.slot(key=("mock",)):
+            for char in comment:
+                await asyncio.sleep(chunk_latency)
+                yield char
+
+    async def draft_async(self, content: str) -> str:  # noqa: ARG002
+        return await self.generate_async()
+
+    def commit(self, content: str, comment: str) -> None:
+        self.context.add_message(content=content)
+        self.fit_context()
+
+        self.history.extend([content, comment])
+        self.context.add_message(content=comment)
+
+    def rollback(self) -> None:
+        if len(self.history) >= 2:  # noqa: PLR2004
+            del self.history[-2:]
+            self.context.discard_last()
+            self.context.discard_last()
+
+    def fit_context(self) -> None:
+        drop_num = self.context.fit()
+        if drop_num > 0:
+            del self.history[:drop_num]
+
+    def close(self) -> None:
+        self.history.clear()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import importlib
+import threading
+from typing import TYPE_CHECKING, Callable, Protocol
+
+if TYPE_CHECKING:
+    import configparser
+
+    from utils.deadline import Deadline
+    from utils.llm.talk_context import TalkContext
+
+
+class Backend(Protocol):
+    model: str
+    context: TalkContext
+
+    def set_action_time_out(self, action_timeout: int) -> None: ...
+
+    def get_tokens(self, text: str) -> int: ...
+
+    # with choices the answer is a JSON object whose "target" is one of them
+    def create_comment(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str: ...
+
+    async def create_comment_async(
+        self,
+        content: str,
+        deadline: Deadline | None = None,
+        choices: list[str] | None = None,
+    ) -> str: ...
+
+    async def draft_async(self, content: str) -> str: ...
+
+    def commit(self, content: str, comment: str) -> None: ...
+
+    # drops the newest question and answer, e.g. a one-off question about the game
+    def rollback(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+BackendFactory = Callable[..., Backend]
+
+
+class BackendRegistry:
+    # "module:attribute" targets are imported on first use, so an agent only pays
+    # for the client library of the backend it actually runs
+    __backends: dict[str, str | BackendFactory] = {  # noqa: RUF012
+        "chatgpt": "utils.llm.ChatGPT:AIWolfNLPChatGPT",
+        "gemini": "utils.llm.Gemini:Gemini",
+        "mock": "utils.llm.Mock:MockLLM",
+        "local": "utils.llm.Local:LocalChatGPT",
+        "llama_cpp": "utils.llm.LlamaCpp:LlamaCppLLM",
+    }
+    __lock = threading.Lock()
+
+    @classmethod
+    def register(cls, name: str, factory: str | BackendFactory) -> None:
+        with cls.__lock:
+            cls.__backends[name.lower()] = factory
+
+    @classmethod
+    def names(cls) -> list[str]:
+        with cls.__lock:
+            return sorted(cls.__backends)
+
+    @classmethod
+    def get(cls, name: str) -> BackendFactory:
+        with cls.__lock:
+            factory = cls.__backends.get(name.lower(), name)
+        if not isinstance(factory, str):
+            return factory
+
+        # an unregistered name may itself be a "module:attribute" target
+        module_name, _, attribute = factory.partition(":")
+        if not attribute:
+            raise ValueError(name, f"登録されていないバックエンドです: {', '.join(cls.names())}")
+        resolved: BackendFactory = getattr(importlib.import_module(module_name), attribute)
+        with cls.__lock:
+            cls.__backends[name.lower()] = resolved
+        return resolved
+
+    @classmethod
+    def module_name(cls, name: str) -> str | None:
+        with cls.__lock:
+            factory = cls.__backends.get(name.lower(), name)
+        if not isinstance(factory, str):
+            return None
+        return factory.partition(":")[0]
+
+    @classmethod
+    def preload(cls, config: configparser.ConfigParser) -> BackendFactory:
+        # importing a client library takes a second or more, so do it before the first game
+        # rather than inside the INITIALIZE request
+        return cls.get(name=cls.backend_name(config=config))
+
+    @classmethod
+    def backend_name(cls, config: configparser.ConfigParser) -> str:
+        name = config.get("model", "backend", fallback="")
+        if name:
+            return name
+        # configs written before the backend option choose with one flag per model
+        if config.getboolean("model", "Mock", fallback=False):
+            return "mock"
+        if config.getboolean("model", "ChatGPT", fallback=False):
+            return "chatgpt"
+        return "gemini"
+
+    @classmethod
+    def create(
+        cls,
+        config: configparser.ConfigParser,
+        system_instruction: str,
+        stable_instruction: str = "",
+    ) -> Backend:
+        factory = cls.get(name=cls.backend_name(config=config))
+        return factory(
+            config=config,
+            system_instruction=system_instruction,
+            stable_instruction=stable_instruction,
+        )
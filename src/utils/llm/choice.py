@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import re
+
+from utils import json_util
+
+agent_pattern = re.compile(r"Agent\[\d+\]")
+
+
+def choice_schema(choices: list[str]) -> dict:
+    # a single enum field is enough for every backend's structured output to pin the answer
+    return {
+        "type": "object",
+        "properties": {"target": {"type": "string", "enum": choices}},
+        "required": ["target"],
+    }
+
+
+def parse_choice(text: str, choices: list[str]) -> str | None:
+    try:
+        value = json_util.loads(text)
+    except ValueError:
+        value = None
+    if isinstance(value, dict) and value.get("target") in choices:
+        return value["target"]
+    # backends without structured output may answer in prose
+    for name in agent_pattern.findall(text):
+        if name in choices:
+            return name
+    return None
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import inspect
+import threading
+from typing import Any, Callable, TypeVar
+
+from utils.llm.event_loop import EventLoop
+
+T = TypeVar("T")
+
+
+class ClientPool:
+    __clients: dict[tuple, Any] = {}  # noqa: RUF012
+    __lock = threading.Lock()
+
+    @classmethod
+    def get(cls, key: tuple, factory: Callable[[], T]) -> T:
+        with cls.__lock:
+            if key not in cls.__clients:
+                cls.__clients[key] = factory()
+            return cls.__clients[key]
+
+    @classmethod
+    async def aclose(cls) -> None:
+        with cls.__lock:
+            clients = list(cls.__clients.values())
+            cls.__clients.clear()
+
+        for client in clients:
+            close = getattr(client, "close", None)
+            if not callable(close):
+                continue
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+
+    @classmethod
+    def close(cls) -> None:
+        EventLoop.run(cls.aclose())
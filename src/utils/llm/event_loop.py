@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import TYPE_CHECKING, Any, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Coroutine
+
+T = TypeVar("T")
+
+
+class CancelScope:
+    def __init__(self) -> None:
+        self.cancelled: bool = False
+        self.futures: set[concurrent.futures.Future] = set()
+        self.lock = threading.Lock()
+
+    def add(self, future: concurrent.futures.Future) -> None:
+        with self.lock:
+            if self.cancelled:
+                future.cancel()
+                return
+            self.futures.add(future)
+
+    def discard(self, future: concurrent.futures.Future) -> None:
+        with self.lock:
+            self.futures.discard(future)
+
+    def cancel(self) -> None:
+        with self.lock:
+            self.cancelled = True
+            futures = list(self.futures)
+            self.futures.clear()
+
+        # cancelling the future cancels the task on the loop, which aborts the HTTP request
+        for future in futures:
+            future.cancel()
+
+
+class EventLoop:
+    __loop: asyncio.AbstractEventLoop | None = None
+    __lock = threading.Lock()
+    __local = threading.local()
+
+    @classmethod
+    def set_loop(cls, loop: asyncio.AbstractEventLoop) -> None:
+        with cls.__lock:
+            cls.__loop = loop
+
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls.__lock:
+            if cls.__loop is None or cls.__loop.is_closed():
+                # no runner owns a loop (e.g. main.py), so host one in a background thread
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="llm-event-loop",
+                    daemon=True,
+                )
+                thread.start()
+                cls.__loop = loop
+            return cls.__loop
+
+    @classmethod
+    def submit(cls, coro: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+        return asyncio.run_coroutine_threadsafe(coro, cls.get_loop())
+
+    @classmethod
+    def get_scope(cls) -> CancelScope | None:
+        return getattr(cls.__local, "scope", None)
+
+    @classmethod
+    def set_scope(cls, scope: CancelScope | None) -> None:
+        cls.__local.scope = scope
+
+    @classmethod
+    def run(cls, coro: Coroutine[Any, Any, T]) -> T:
+        loop = cls.get_loop()
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            coro.close()
+            raise RuntimeError("イベントループのスレッドから同期的にLLMを呼び出すことはできません")
+
+        scope = cls.get_scope()
+        if scope is not None and scope.cancelled:
+            coro.close()
+            raise concurrent.futures.CancelledError
+
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        if scope is None:
+            return future.result()
+
+        scope.add(future)
+        try:
+            return future.result()
+        finally:
+            scope.discard(future)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import math
+import random
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+if TYPE_CHECKING:
+    import configparser
+    from collections.abc import AsyncIterator, Awaitable, Hashable
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = asyncio.get_running_loop().time()
+
+    async def acquire(self) -> None:
+        # waiters are already ordered by the slots, so a plain sleep keeps that order
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PrioritySlots:
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self.waiting: list[tuple[float, int, asyncio.Future[None]]] = []
+        self.counter = itertools.count()
+
+    async def acquire(self, priority: float) -> None:
+        if self.limit <= 0 or (self.used < self.limit and not self.waiting):
+            self.used += 1
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (priority, next(self.counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # the slot may have been handed over just before the cancellation
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        # the freed slot goes straight to the waiter whose deadline comes first
+        while self.waiting:
+            _, _, future = heapq.heappop(self.waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.used -= 1
+
+
+class RequestGateway:
+    enable = False
+    # 0 leaves the number of requests in flight unlimited
+    max_concurrency = 8
+    batch_window = 0.02
+    max_batch = 8
+    # requests per second for each API key; 0 disables the token bucket
+    rate = 0.0
+    burst = 1
+    max_retries = 3
+    backoff = 0.5
+    max_backoff = 8.0
+
+    # touched only from the process's event loop, so no lock is needed
+    __loop: asyncio.AbstractEventLoop | None = None
+    __slots: PrioritySlots | None = None
+    __buckets: dict[Hashable, TokenBucket] = {}  # noqa: RUF012
+    __waiting: list[asyncio.Future[None]] = []  # noqa: RUF012
+    __flush_handle: asyncio.TimerHandle | None = None
+    __retry_num: int = 0
+
+    @classmethod
+    def configure(cls, config: configparser.ConfigParser) -> None:
+        cls.enable = config.getboolean("gateway", "enable", fallback=False)
+        cls.max_concurrency = config.getint(
+            "gateway",
+            "max_concurrency",
+            fallback=RequestGateway.max_concurrency,
+        )
+        cls.batch_window = config.getfloat(
+            "gateway",
+            "batch_window",
+            fallback=RequestGateway.batch_window,
+        )
+        cls.max_batch = config.getint("gateway", "max_batch", fallback=RequestGateway.max_batch)
+        cls.rate = config.getfloat("gateway", "rate", fallback=RequestGateway.rate)
+        cls.burst = config.getint("gateway", "burst", fallback=RequestGateway.burst)
+        cls.max_retries = config.getint(
+            "gateway",
+            "max_retries",
+            fallback=RequestGateway.max_retries,
+        )
+        cls.backoff = config.getfloat("gateway", "backoff", fallback=RequestGateway.backoff)
+
+    @classmethod
+    def client_retries(cls, default: int) -> int:
+        # the gateway retries within the action's budget, so the client must not retry as well
+        return 0 if cls.enable and cls.max_retries > 0 else default
+
+    @classmethod
+    def retry_num(cls) -> int:
+        return cls.__retry_num
+
+    @classmethod
+    def bind(cls) -> PrioritySlots:
+        # asyncio primitives belong to one loop; start over when a new runner takes over
+        loop = asyncio.get_running_loop()
+        if cls.__loop is not loop or cls.__slots is None:
+            cls.__loop = loop
+            cls.__slots = PrioritySlots(limit=cls.max_concurrency)
+            cls.__buckets = {}
+            cls.__waiting = []
+            cls.__flush_handle = None
+        return cls.__slots
+
+    @classmethod
+    def get_bucket(cls, key: Hashable) -> TokenBucket | None:
+        if cls.rate <= 0:
+            return None
+        if key not in cls.__buckets:
+            cls.__buckets[key] = TokenBucket(rate=cls.rate, burst=cls.burst)
+        return cls.__buckets[key]
+
+    @classmethod
+    def flush(cls) -> None:
+        waiting = cls.__waiting
+        cls.__waiting = []
+        if cls.__flush_handle is not None:
+            cls.__flush_handle.cancel()
+            cls.__flush_handle = None
+        for future in waiting:
+            if not future.done():
+                future.set_result(None)
+
+    @classmethod
+    async def wait_batch(cls) -> None:
+        # requests from every agent that arrive within the window are released together,
+        # so a self-hosted server sees them as one batch instead of a trickle
+        if cls.batch_window <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[None] = loop.create_future()
+        cls.__waiting.append(future)
+        if 0 < cls.max_batch <= len(cls.__waiting):
+            cls.flush()
+        elif cls.__flush_handle is None:
+            cls.__flush_handle = loop.call_later(cls.batch_window, cls.flush)
+        await future
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def slot(
+        cls,
+        key: Hashable = None,
+        timeout: float | None = None,
+    ) -> AsyncIterator[None]:
+        # held for the whole request, including every chunk of a stream
+        if not cls.enable:
+            yield
+            return
+        slots = cls.bind()
+        await cls.wait_batch()
+        # the request whose action times out first is served first
+        expires = asyncio.get_running_loop().time() + timeout if timeout is not None else math.inf
+        await slots.acquire(priority=expires)
+        try:
+            bucket = cls.get_bucket(key=key)
+            if bucket is not None:
+                await bucket.acquire()
+            yield
+        finally:
+            slots.release()
+
+    @classmethod
+    def retry_delay(cls, attempt: int, error: BaseException) -> float:
+        # full jitter keeps agents that were throttled together from retrying together
+        delay = random.uniform(0, min(cls.max_backoff, cls.backoff * 2**attempt))  # noqa: S311
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        with contextlib.suppress(TypeError, ValueError):
+            delay = max(delay, float(headers.get("retry-after")))
+        return delay
+
+    @classmethod
+    async def call(
+        cls,
+        factory: Callable[[], Awaitable[T]],
+        key: Hashable = None,
+        timeout: float | None = None,
+        retryable: tuple[type[BaseException], ...] = (),
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def attempt() -> T:
+            # the slot is released while waiting to retry
+            remaining = timeout - (loop.time() - start) if timeout is not None else None
+            async with cls.slot(key=key, timeout=remaining):
+                return await factory()
+
+        return await cls.retry(factory=attempt, timeout=timeout, retryable=retryable)
+
+    @classmethod
+    async def retry(
+        cls,
+        factory: Callable[[], Awaitable[T]],
+        timeout: float | None = None,
+        retryable: tuple[type[BaseException], ...] = (),
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        attempt = 0
+        while True:
+            try:
+                return await factory()
+            except retryable as e:
+                if not cls.enable or attempt >= cls.max_retries:
+                    raise
+                delay = cls.retry_delay(attempt=attempt, error=e)
+                # give up early rather than sleep past the action's deadline
+                if timeout is not None and loop.time() - start + delay >= timeout:
+                    raise
+                attempt += 1
+                cls.__retry_num += 1
+                await asyncio.sleep(delay)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import configparser
+
+
+class ResponseCache:
+    enable = False
+    path = Path("./cache/responses.sqlite3")
+    # 0 keeps every response
+    max_size = 64 * 1024 * 1024
+    # hits whose last use is written in one transaction
+    used_batch = 64
+
+    __connection: sqlite3.Connection | None = None
+    __executor: ThreadPoolExecutor | None = None
+    # last use of each hit not yet written to the file
+    __used: dict[str, float] = {}  # noqa: RUF012
+    # size of the stored responses, counted once on connect and kept up to date by put
+    __total: int = 0
+    __lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, config: configparser.ConfigParser) -> None:
+        cls.enable = config.getboolean("response_cache", "enable", fallback=False)
+        cls.path = Path(config.get("response_cache", "path", fallback=str(ResponseCache.path)))
+        cls.max_size = config.getint("response_cache", "max_size", fallback=ResponseCache.max_size)
+
+    @classmethod
+    def connect(cls) -> sqlite3.Connection:
+        # called with the lock held; one connection per process, shared by every agent
+        if cls.__connection is None:
+            cls.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(cls.path, timeout=10, check_same_thread=False)
+            # several processes started by multi.py may use the same file
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, used REAL)",
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            connection.commit()
+            cls.__connection = connection
+            cls.__total = cls.total_size(connection=connection)
+        return cls.__connection
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        # sqlite calls block; one thread runs them all so they never stall the event loop
+        with cls.__lock:
+            if cls.__executor is None:
+                cls.__executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="response-cache",
+                )
+            return cls.__executor
+
+    @staticmethod
+    def make_key(model: str, params: dict, messages: list) -> str:
+        # sorted keys make the hash independent of how the request was assembled
+        text = json.dumps(
+            {"model": model, "params": params, "messages": messages},
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @classmethod
+    async def get_async(cls, key: str) -> str | None:
+        if not cls.enable:
+            return None
+        return await asyncio.wrap_future(cls.get_executor().submit(cls.get, key))
+
+    @classmethod
+    def put_async(cls, key: str, model: str, response: str) -> None:
+        # nothing waits for the write, so the answer is returned as soon as it arrives
+        if cls.enable:
+            cls.get_executor().submit(cls.put, key, model, response)
+
+    @classmethod
+    def get(cls, key: str) -> str | None:
+        if not cls.enable:
+            return None
+        with cls.__lock:
+            connection = cls.connect()
+            row = connection.execute(
+                "SELECT response FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            cls.__used[key] = time.time()
+            if len(cls.__used) >= cls.used_batch:
+                cls.write_used(connection=connection)
+                connection.commit()
+            return row[0]
+
+    @classmethod
+    def put(cls, key: str, model: str, response: str) -> None:
+        if not cls.enable:
+            return
+        size = len(response.encode())
+        with cls.__lock:
+            connection = cls.connect()
+            row = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, size, time.time()),
+            )
+            cls.__total += size - (row[0] if row is not None else 0)
+            cls.__used.pop(key, None)
+            cls.write_used(connection=connection)
+            cls.evict(connection=connection)
+            connection.commit()
+
+    @classmethod
+    def write_used(cls, connection: sqlite3.Connection) -> None:
+        # called with the lock held; the caller commits
+        if not cls.__used:
+            return
+        connection.executemany(
+            "UPDATE responses SET used = ? WHERE key = ?",
+            [(used, key) for key, used in cls.__used.items()],
+        )
+        cls.__used.clear()
+
+    @staticmethod
+    def total_size(connection: sqlite3.Connection) -> int:
+        return connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses",
+        ).fetchone()[0]
+
+    @classmethod
+    def evict(cls, connection: sqlite3.Connection) -> None:
+        # drop the least recently used responses until the total fits in max_size
+        if cls.max_size <= 0 or cls.__total <= cls.max_size:
+            return
+        # other processes may have written to the same file, so count again before dropping
+        total = cls.total_size(connection=connection)
+        if total > cls.max_size:
+            rows = connection.execute("SELECT key, size FROM responses ORDER BY used").fetchall()
+            keys = []
+            for key, size in rows:
+                if total <= cls.max_size:
+                    break
+                keys.append((key,))
+                total -= size
+            connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+        cls.__total = total
+
+    @classmethod
+    def close(cls) -> None:
+        with cls.__lock:
+            executor = cls.__executor
+            cls.__executor = None
+        # let the queued writes finish before the connection goes away
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with cls.__lock:
+            if cls.__connection is not None:
+                cls.write_used(connection=cls.__connection)
+                cls.__connection.commit()
+                cls.__connection.close()
+                cls.__connection = None
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import dataclasses
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import configparser
+    from collections.abc import AsyncGenerator
+
+    from utils.deadline import Deadline
+
+
+@dataclasses.dataclass
+class StreamOptions:
+    enable: bool = False
+    max_length: int = 0
+    max_sentences: int = 0
+    reserve: float = 0.2
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> StreamOptions:
+        return cls(
+            enable=config.getboolean("stream", "enable", fallback=False),
+            max_length=config.getint("stream", "max_length", fallback=0),
+            max_sentences=config.getint("stream", "max_sentences", fallback=0),
+            reserve=config.getfloat("stream", "reserve", fallback=0.2),
+        )
+
+
+class StreamCollector:
+    sentence_endings = frozenset("。！？!?\n")
+
+    def __init__(self, options: StreamOptions) -> None:
+        self.options = options
+        self.text: str = ""
+        self.sentence_end: int = 0
+        self.sentence_num: int = 0
+        self.timed_out: bool = False
+
+    def add(self, chunk: str) -> bool:
+        start = len(self.text)
+        self.text += chunk
+        for i in range(start, len(self.text)):
+            if self.text[i] in StreamCollector.sentence_endings:
+                self.sentence_end = i + 1
+                self.sentence_num += 1
+                if 0 < self.options.max_sentences <= self.sentence_num:
+                    self.text = self.text[: self.sentence_end]
+                    return True
+        return 0 < self.options.max_length <= len(self.text)
+
+    def result(self) -> str:
+        text = self.text
+        if 0 < self.options.max_length <= len(text):
+            text = text[: self.options.max_length]
+            # prefer ending on a complete sentence when the length limit cut the stream
+            if 0 < self.sentence_end <= len(text):
+                text = text[: self.sentence_end]
+        return text.strip()
+
+    def partial(self) -> str:
+        if self.sentence_end > 0:
+            return self.text[: self.sentence_end].strip()
+        return self.text.strip()
+
+    async def collect(
+        self,
+        chunks: AsyncGenerator[str, None],
+        deadline: Deadline | None = None,
+    ) -> str:
+        # stop slightly before the action itself times out so the partial text wins the race
+        timeout = deadline.budget(reserve=self.options.reserve) if deadline is not None else None
+        try:
+            # closing the generator closes the underlying response stream
+            async with contextlib.aclosing(chunks), asyncio.timeout(timeout):
+                async for chunk in chunks:
+                    if self.add(chunk):
+                        return self.result()
+        except TimeoutError:
+            # send the best partial utterance instead of missing the deadline
+            if self.partial() == "":
+                raise
+            self.timed_out = True
+            return self.partial()
+        return self.result()
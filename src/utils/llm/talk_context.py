@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from utils.talk_history import Talk, TalkHistory
+
+
+class TalkContext:
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        max_tokens: int = 0,
+        prefix: str = "",
+    ) -> None:
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.prefix_tokens: int = count_tokens(prefix) if prefix else 0
+        self.sent: set[tuple[int, int]] = set()
+        # talks at the head of the history that have all been sent
+        self.sent_num: int = 0
+        self.message_tokens: deque[int] = deque()
+        self.total_tokens: int = 0
+        self.usage: tuple[int, int, int] | None = None
+
+    def unsent_talks(self, talk_history: TalkHistory | None) -> list[Talk]:
+        if talk_history is None:
+            return []
+        while (
+            self.sent_num < len(talk_history) and talk_history[self.sent_num].key in self.sent
+        ):
+            self.sent_num += 1
+        return [talk for talk in talk_history.since(self.sent_num) if talk.key not in self.sent]
+
+    def mark_sent(self, talks: list[Talk]) -> None:
+        self.sent.update(talk.key for talk in talks)
+
+    def add_message(self, content: str) -> None:
+        tokens = self.count_tokens(content)
+        self.message_tokens.append(tokens)
+        self.total_tokens += tokens
+        self.usage = None
+
+    def fit(self) -> int:
+        if self.max_tokens <= 0:
+            return 0
+
+        # drop whole user/assistant turns so the history keeps alternating roles,
+        # and never drop the newest message that is about to be sent
+        drop_num = 0
+        while (
+            self.prefix_tokens + self.total_tokens > self.max_tokens
+            and len(self.message_tokens) > 2  # noqa: PLR2004
+        ):
+            self.total_tokens -= self.message_tokens.popleft()
+            self.total_tokens -= self.message_tokens.popleft()
+            drop_num += 2
+        return drop_num
+
+    def report_usage(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+    ) -> None:
+        # counts reported by the provider for the newest message replace the local estimate
+        self.usage = (prompt_tokens, completion_tokens, cached_tokens)
+
+    def last_usage(self) -> tuple[int, int, int]:
+        # prompt, completion and cached prompt tokens of the request that produced the newest
+        # message; without a provider report the cached count is unknown and left at 0
+        if self.usage is not None:
+            return self.usage
+        if not self.message_tokens:
+            return 0, 0, 0
+        completion = self.message_tokens[-1]
+        return self.prefix_tokens + self.total_tokens - completion, completion, 0
+
+    def discard_last(self) -> None:
+        if self.message_tokens:
+            self.total_tokens -= self.message_tokens.pop()
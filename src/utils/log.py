@@ -1,27 +1,132 @@
 from __future__ import annotations
 
+import atexit
+import gzip
 import logging
 import logging.handlers
-from typing import TYPE_CHECKING
+import queue
+import threading
+from typing import TYPE_CHECKING, TextIO
 
 if TYPE_CHECKING:
     from pathlib import Path
 
 
+class FileRouter(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.streams: dict[str, TextIO] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            path: str = record.log_path  # type: ignore  # noqa: PGH003
+            stream = self.streams.get(path)
+            if getattr(record, "log_close", False):
+                if stream is not None:
+                    stream.close()
+                    del self.streams[path]
+                return
+
+            if stream is None:
+                if path.endswith(".gz"):
+                    stream = gzip.open(path, mode="wt", encoding=Log.encoding)  # noqa: SIM115
+                else:
+                    stream = open(path, mode="w", encoding=Log.encoding)  # noqa: SIM115, PTH123
+                self.streams[path] = stream
+            # the record was formatted by the queue handler on the caller's thread
+            stream.write(record.getMessage() + "\n")
+        except Exception:  # noqa: BLE001
+            self.handleError(record)
+
+    def flush(self) -> None:
+        for stream in self.streams.values():
+            stream.flush()
+
+    def close(self) -> None:
+        for stream in self.streams.values():
+            stream.close()
+        self.streams.clear()
+        super().close()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    def __init__(self, log_queue: queue.SimpleQueue, router: FileRouter) -> None:
+        super().__init__(log_queue, router)
+        self.router = router
+
+    def dequeue(self, block: bool) -> logging.LogRecord:  # noqa: FBT001
+        # write everything queued so far in one go and flush only once the queue runs dry
+        if self.queue.empty():
+            self.router.flush()
+        return self.queue.get(block)
+
+    def stop(self) -> None:
+        super().stop()
+        self.router.close()
+
+
+class LogWriter:
+    __queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    __listener: BatchQueueListener | None = None
+    __lock = threading.Lock()
+
+    @classmethod
+    def get_queue(cls) -> queue.SimpleQueue[logging.LogRecord]:
+        with cls.__lock:
+            if cls.__listener is None:
+                cls.__listener = BatchQueueListener(log_queue=cls.__queue, router=FileRouter())
+                cls.__listener.start()
+                atexit.register(cls.stop)
+        return cls.__queue
+
+    @classmethod
+    def stop(cls) -> None:
+        # waits for every queued record to be written; the writer restarts on the next log
+        with cls.__lock:
+            listener = cls.__listener
+            cls.__listener = None
+        if listener is not None:
+            listener.stop()
+            atexit.unregister(cls.stop)
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.SimpleQueue, path: str) -> None:
+        super().__init__(log_queue)
+        self.path = path
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.log_path = self.path
+        return record
+
+    def close_file(self) -> None:
+        self.enqueue(logging.makeLogRecord({"log_path": self.path, "log_close": True}))
+
+
 class Log:
     encoding: str = "utf-8"
 
+    __created_dirs: set[Path] = set()
+    __dir_lock = threading.Lock()
+
     def __init__(self, filename: Path, name: str) -> None:
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.DEBUG)
-        self.handler = logging.FileHandler(
-            filename,
-            mode="w",
-            encoding=Log.encoding,
-        )
+        # records are written by a background thread so disk I/O stays out of the action path
+        self.handler = LogQueueHandler(log_queue=LogWriter.get_queue(), path=str(filename))
         self.handler.setFormatter(logging.Formatter("%(message)s"))
         self.logger.addHandler(self.handler)
 
+    @classmethod
+    def prepare_dir(cls, path: Path) -> None:
+        # mkdir is idempotent across processes; the cache only saves repeated system calls
+        with cls.__dir_lock:
+            if path in cls.__created_dirs:
+                return
+            path.mkdir(parents=True, exist_ok=True)
+            cls.__created_dirs.add(path)
+
     def debug(self, msg: object) -> None:
         self.logger.debug(msg)
 
@@ -41,6 +146,7 @@ class Log:
         self.logger.critical(msg)
 
     def close(self) -> None:
+        # only this log's file is closed; other games keep writing through the same writer
         self.logger.removeHandler(self.handler)
+        self.handler.close_file()
         self.handler.close()
-        logging.shutdown()
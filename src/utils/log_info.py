@@ -12,8 +12,6 @@ class LogInfo:
     def __init__(self) -> None:
         self.__game_start_time = multiprocessing.sharedctypes.Array("c", 100)
         self.__log_num = multiprocessing.Value("i", 0)
-        self.__log_times_num = multiprocessing.Value("i", 0)
-        self.__log_prepare_done_num = multiprocessing.Value("i", 0)
 
     @property
     def game_start_time(self) -> str:
@@ -33,27 +31,14 @@ class LogInfo:
     def log_num(self) -> int:
         return self.__log_num.value
 
-    def increment_log_num(self) -> None:
-        self.__log_num.value += 1
-
-    @property
-    def log_times_num(self) -> int:
-        return self.__log_times_num.value
-
-    @log_times_num.setter
-    def log_times_num(self, times: int) -> ValueError | None:
-        if type(times) is not int:
-            raise ValueError(times, "is not int")
-
-        self.__log_times_num.value = times
-
-    @property
-    def log_prepare_done_num(self) -> int:
-        return self.__log_prepare_done_num.value
-
-    def increment_log_prepare_done_num(self) -> None:
-        self.__log_prepare_done_num.value += 1
-
-    def reset_params(self) -> None:
-        self.log_times_num = 0
-        self.__log_prepare_done_num.value = 0
+    def next_game_start_time(self, agent_num: int) -> datetime.datetime:
+        # used only when the server sends no game ID: every agent_num agents to open a log
+        # share a game, and the lock makes the count and the start time one atomic step
+        with self.__log_num.get_lock():
+            if self.__log_num.value % agent_num == 0:
+                self.game_start_time = datetime.datetime.now()  # noqa: DTZ005
+            self.__log_num.value += 1
+            return datetime.datetime.strptime(  # noqa: DTZ007
+                self.game_start_time,
+                LogInfo.format,
+            )
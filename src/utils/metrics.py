@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import contextlib
+import http.server
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from utils.deadline import Deadline
+from utils.llm.gateway import RequestGateway
+
+if TYPE_CHECKING:
+    import configparser
+    from collections.abc import Iterator
+
+
+class Histogram:
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self) -> None:
+        self.bucket_counts: list[int] = [0] * len(Histogram.buckets)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(Histogram.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count > 0 else 0.0,
+            "max": self.max,
+        }
+
+
+class GameMetrics:
+    def __init__(self, role: str = "") -> None:
+        self.role = role
+        self.request: str = ""
+        self.request_tokens: tuple[int, int, int] = (0, 0, 0)
+        self.request_fallback: bool = False
+        self.durations: dict[tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.tokens: Counter[str] = Counter()
+        self.fallback_nums: Counter[str] = Counter()
+        self.error_nums: Counter[str] = Counter()
+
+    def start_request(self, request: str) -> None:
+        self.request = request
+        self.request_tokens = (0, 0, 0)
+        self.request_fallback = False
+
+    def observe(self, phase: str, seconds: float, request: str | None = None) -> None:
+        request = request if request is not None else self.request
+        self.durations[phase, request].observe(seconds)
+        Metrics.observe(phase=phase, request=request, role=self.role, seconds=seconds)
+
+    @contextlib.contextmanager
+    def measure(self, phase: str, request: str | None = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase=phase, seconds=time.perf_counter() - start, request=request)
+
+    def add_tokens(self, prompt: int, completion: int, cached: int = 0) -> None:
+        self.tokens["prompt"] += prompt
+        self.tokens["completion"] += completion
+        self.tokens["cached"] += cached
+        self.request_tokens = (
+            self.request_tokens[0] + prompt,
+            self.request_tokens[1] + completion,
+            self.request_tokens[2] + cached,
+        )
+        Metrics.add_tokens(
+            request=self.request,
+            role=self.role,
+            prompt=prompt,
+            completion=completion,
+            cached=cached,
+        )
+
+    def fallback(self, request: str | None = None) -> None:
+        request = request if request is not None else self.request
+        self.fallback_nums[request] += 1
+        self.request_fallback = True
+        Metrics.count_fallback(request=request, role=self.role)
+
+    def error(self, request: str | None = None) -> None:
+        request = request if request is not None else self.request
+        self.error_nums[request] += 1
+        Metrics.count_error(request=request, role=self.role)
+
+    def summary(self) -> dict:
+        phases: dict[str, dict] = defaultdict(dict)
+        for (phase, request), histogram in sorted(self.durations.items()):
+            phases[phase][request] = histogram.summary()
+        return {
+            "role": self.role,
+            "phases": dict(phases),
+            "tokens": dict(self.tokens),
+            "fallbacks": dict(self.fallback_nums),
+            "errors": dict(self.error_nums),
+        }
+
+
+class Metrics:
+    prefix = "aiwolf"
+
+    __durations: dict[tuple[str, str, str], Histogram] = defaultdict(Histogram)
+    __tokens: Counter[tuple[str, str, str]] = Counter()
+    __fallback_nums: Counter[tuple[str, str]] = Counter()
+    __error_nums: Counter[tuple[str, str]] = Counter()
+    __agent_game_num: int = 0
+    __lock = threading.Lock()
+    __export_lock = threading.Lock()
+
+    __file_path: Path | None = None
+    __server: http.server.ThreadingHTTPServer | None = None
+
+    @classmethod
+    def configure(cls, config: configparser.ConfigParser, idx: int | None = None) -> None:
+        # with idx, e.g. metrics.prom becomes metrics.3.prom and port 9100 becomes 9102
+        file_path = config.get("metrics", "prometheus_file", fallback="")
+        cls.__file_path = Path(file_path) if file_path else None
+        if cls.__file_path is not None and idx is not None:
+            cls.__file_path = cls.__file_path.with_name(
+                f"{cls.__file_path.stem}.{idx}{cls.__file_path.suffix}",
+            )
+        port = config.getint("metrics", "port", fallback=0)
+        if port > 0:
+            cls.serve(
+                host=config.get("metrics", "host", fallback="127.0.0.1"),
+                port=port + idx - 1 if idx is not None else port,
+            )
+
+    @classmethod
+    def observe(cls, phase: str, request: str, role: str, seconds: float) -> None:
+        with cls.__lock:
+            cls.__durations[phase, request, role].observe(seconds)
+
+    @classmethod
+    def add_tokens(  # noqa: PLR0913
+        cls,
+        request: str,
+        role: str,
+        prompt: int,
+        completion: int,
+        cached: int = 0,
+    ) -> None:
+        with cls.__lock:
+            cls.__tokens["prompt", request, role] += prompt
+            cls.__tokens["completion", request, role] += completion
+            cls.__tokens["cached", request, role] += cached
+
+    @classmethod
+    def count_fallback(cls, request: str, role: str) -> None:
+        with cls.__lock:
+            cls.__fallback_nums[request, role] += 1
+
+    @classmethod
+    def count_error(cls, request: str, role: str) -> None:
+        with cls.__lock:
+            cls.__error_nums[request, role] += 1
+
+    @classmethod
+    def count_agent_game(cls) -> None:
+        with cls.__lock:
+            cls.__agent_game_num += 1
+
+    @classmethod
+    def summary(cls) -> dict:
+        with cls.__lock:
+            phases: dict[str, dict] = defaultdict(lambda: defaultdict(dict))
+            for (phase, request, role), histogram in sorted(cls.__durations.items()):
+                phases[phase][request][role] = histogram.summary()
+            return {
+                "agent_games": cls.__agent_game_num,
+                "phases": {phase: dict(requests) for phase, requests in phases.items()},
+                "tokens": {"/".join(key): num for key, num in sorted(cls.__tokens.items())},
+                "fallbacks": {
+                    "/".join(key): num for key, num in sorted(cls.__fallback_nums.items())
+                },
+                "errors": {"/".join(key): num for key, num in sorted(cls.__error_nums.items())},
+                "retries": RequestGateway.retry_num(),
+            }
+
+    @staticmethod
+    def labels(**kwargs: str) -> str:
+        # label values escape backslashes and quotes as the text format requires
+        text = ",".join(
+            '{}="{}"'.format(key, value.replace("\\", "\\\\").replace('"', '\\"'))
+            for key, value in kwargs.items()
+        )
+        return "{" + text + "}"
+
+    @classmethod
+    def to_prometheus(cls) -> str:
+        name = f"{cls.prefix}_phase_seconds"
+        lines = [
+            f"# HELP {name} Wall time spent in each phase of handling a request.",
+            f"# TYPE {name} histogram",
+        ]
+        with cls.__lock:
+            for (phase, request, role), histogram in sorted(cls.__durations.items()):
+                for bound, num in zip(Histogram.buckets, histogram.bucket_counts, strict=True):
+                    labels = cls.labels(phase=phase, request=request, role=role, le=str(bound))
+                    lines.append(f"{name}_bucket{labels} {num}")
+                labels = cls.labels(phase=phase, request=request, role=role, le="+Inf")
+                lines.append(f"{name}_bucket{labels} {histogram.count}")
+                labels = cls.labels(phase=phase, request=request, role=role)
+                lines.append(f"{name}_sum{labels} {histogram.sum}")
+                lines.append(f"{name}_count{labels} {histogram.count}")
+
+            counters = (
+                (
+                    "tokens_total",
+                    "LLM tokens sent and received; cached is the part of prompt served from cache.",
+                    cls.__tokens,
+                    ("kind", "request", "role"),
+                ),
+                (
+                    "fallbacks_total",
+                    "Responses replaced by a fallback.",
+                    cls.__fallback_nums,
+                    ("request", "role"),
+                ),
+                (
+                    "errors_total",
+                    "Errors raised while handling a request.",
+                    cls.__error_nums,
+                    ("request", "role"),
+                ),
+            )
+            for suffix, description, counter, keys in counters:
+                name = f"{cls.prefix}_{suffix}"
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} counter")
+                for values, num in sorted(counter.items()):
+                    labels = cls.labels(**dict(zip(keys, values, strict=True)))
+                    lines.append(f"{name}{labels} {num}")
+
+            agent_game_num = cls.__agent_game_num
+
+        for suffix, description, num in (
+            ("agent_games_total", "Games finished by the agents in this process.", agent_game_num),
+            ("deadline_total", "Requests checked against their deadline.", Deadline.total_num()),
+            (
+                "deadline_missed_total",
+                "Requests answered after their deadline.",
+                Deadline.missed_num(),
+            ),
+            (
+                "llm_retries_total",
+                "LLM requests retried by the gateway.",
+                RequestGateway.retry_num(),
+            ),
+        ):
+            name = f"{cls.prefix}_{suffix}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {num}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def export(cls) -> None:
+        if cls.__file_path is None:
+            return
+        text = cls.to_prometheus()
+        with cls.__export_lock:
+            cls.__file_path.parent.mkdir(parents=True, exist_ok=True)
+            # replace the file in one step so a scraper never reads a half written file
+            tmp_path = cls.__file_path.with_name(f"{cls.__file_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            tmp_path.replace(cls.__file_path)
+
+    @classmethod
+    def serve(cls, host: str, port: int) -> None:
+        with cls.__lock:
+            if cls.__server is not None:
+                return
+            cls.__server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(
+            target=cls.__server.serve_forever,
+            name="metrics",
+            daemon=True,
+        ).start()
+
+    @classmethod
+    def close(cls) -> None:
+        with cls.__lock:
+            server = cls.__server
+            cls.__server = None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = Metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import configparser
+import datetime
+import gzip
+import json
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, TextIO
+
+from utils.log import Log
+from utils.log_info import LogInfo
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class SessionRecorder(Log):
+    suffix = ".jsonl"
+    compressed_suffix = ".jsonl.gz"
+    received = "r"
+    sent = "s"
+
+    def __init__(self, output_dir: Path, agent_name: str, url: str, *, compress: bool) -> None:
+        Log.prepare_dir(path=output_dir)
+        started = datetime.datetime.now()  # noqa: DTZ005
+        suffix = SessionRecorder.compressed_suffix if compress else SessionRecorder.suffix
+        super().__init__(
+            filename=Path.joinpath(
+                output_dir,
+                started.strftime(LogInfo.format) + "_" + agent_name + suffix,
+            ),
+            name=f"sessions.{agent_name}",
+        )
+        self.start = time.monotonic()
+        # the first line describes the session; every other line is [seconds, "r" or "s", text]
+        self.info(
+            json.dumps(
+                {"name": agent_name, "url": url, "started": started.isoformat()},
+                ensure_ascii=False,
+            ),
+        )
+
+    @classmethod
+    def from_config(
+        cls,
+        config: configparser.ConfigParser,
+        agent_name: str,
+    ) -> SessionRecorder | None:
+        if not config.getboolean("record", "enable", fallback=False):
+            return None
+        return cls(
+            output_dir=Path(config.get("record", "output_dir", fallback="./log/sessions")),
+            agent_name=agent_name,
+            url=config.get("websocket", "url", fallback=""),
+            compress=config.getboolean("record", "compress", fallback=True),
+        )
+
+    def write(self, direction: str, texts: str | list[str]) -> None:
+        elapsed = round(time.monotonic() - self.start, 6)
+        for text in [texts] if isinstance(texts, str) else texts:
+            self.info(json.dumps([elapsed, direction, text], ensure_ascii=False))
+
+    def record_received(self, texts: str | list[str]) -> None:
+        self.write(direction=SessionRecorder.received, texts=texts)
+
+    def record_sent(self, text: str) -> None:
+        self.write(direction=SessionRecorder.sent, texts=text)
+
+
+class SessionReader:
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.header: dict = {}
+        self.frames: list[tuple[float, str, str]] = []
+        with SessionReader.open(path=self.path) as f:
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    value = json.loads(line)
+                    if isinstance(value, dict):
+                        self.header = value
+                    else:
+                        self.frames.append((value[0], value[1], value[2]))
+            except EOFError:
+                # a session that was killed leaves an unterminated gzip file
+                pass
+
+    @staticmethod
+    def open(path: Path) -> TextIO:
+        if path.name.endswith(".gz"):
+            return gzip.open(path, mode="rt", encoding=Log.encoding)
+        return path.open(encoding=Log.encoding)
+
+    def received(self) -> Iterator[tuple[float, str]]:
+        for elapsed, direction, text in self.frames:
+            if direction == SessionRecorder.received:
+                yield elapsed, text
+
+    def sent(self) -> list[str]:
+        return [text for _, direction, text in self.frames if direction == SessionRecorder.sent]
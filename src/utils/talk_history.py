@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from aiwolf_nlp_common.protocol.list.talk_list import TalkInfo
+
+
+class Talk:
+    __slots__ = ("agent", "day", "idx", "line", "over", "skip", "text", "turn")
+
+    def __init__(  # noqa: PLR0913
+        self,
+        agent: str,
+        day: int,
+        idx: int,
+        text: str,
+        turn: int = 0,
+        *,
+        skip: bool = False,
+        over: bool = False,
+    ) -> None:
+        self.agent = agent
+        self.day = day
+        self.idx = idx
+        self.text = text
+        self.turn = turn
+        self.skip = skip
+        self.over = over
+        # rendered once here instead of every time a prompt is built
+        self.line = f"{agent}:{text}"
+
+    @classmethod
+    def from_info(cls, talk: TalkInfo) -> Talk:
+        return cls(
+            agent=talk.agent,
+            day=talk.day,
+            idx=talk.idx,
+            text=talk.text,
+            turn=talk.turn,
+            skip=talk.skip,
+            over=talk.over,
+        )
+
+    @property
+    def key(self) -> tuple[int, int]:
+        return self.day, self.idx
+
+
+class TalkHistory:
+    def __init__(self) -> None:
+        self.talks: list[Talk] = []
+        self.keys: set[tuple[int, int]] = set()
+
+    def __len__(self) -> int:
+        return len(self.talks)
+
+    def __iter__(self) -> Iterator[Talk]:
+        return iter(self.talks)
+
+    def __getitem__(self, index: int) -> Talk:
+        return self.talks[index]
+
+    def add(self, talks: Iterable[TalkInfo] | None) -> list[Talk]:
+        # the server may send a talk both with TALK and again with DAILY_FINISH
+        added: list[Talk] = []
+        if talks is None:
+            return added
+        for info in talks:
+            if (info.day, info.idx) in self.keys:
+                continue
+            talk = Talk.from_info(talk=info)
+            self.keys.add(talk.key)
+            self.talks.append(talk)
+            added.append(talk)
+        return added
+
+    def since(self, start: int) -> list[Talk]:
+        return self.talks[start:]
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import concurrent.futures
+from typing import TYPE_CHECKING
+
+from res.prompt import Prompt
+from utils.llm.event_loop import EventLoop
+
+if TYPE_CHECKING:
+    from aiwolf_nlp_common.role import Role
+
+    from utils.llm.backend import Backend
+    from utils.talk_history import Talk
+
+
+class TalkDraft:
+    def __init__(
+        self,
+        day: int,
+        talks: list[Talk],
+        prompt: str,
+        future: concurrent.futures.Future[str],
+    ) -> None:
+        self.day = day
+        self.talks = talks
+        self.prompt = prompt
+        self.future = future
+
+
+class TalkSpeculator:
+    # the whole answer to the refresh prompt when the draft still fits the new talks
+    keep = "KEEP"
+
+    def __init__(self, wait: float = 0.1) -> None:
+        self.wait = wait
+        self.draft: TalkDraft | None = None
+
+    def start(
+        self,
+        model: Backend,
+        day: int,
+        talks: list[Talk],
+        role: Role | None = None,
+    ) -> None:
+        self.cancel()
+        prompt = Prompt.get_talk_prompt(talk_history=talks, role=role)
+        self.draft = TalkDraft(
+            day=day,
+            talks=talks,
+            prompt=prompt,
+            future=EventLoop.submit(model.draft_async(content=prompt)),
+        )
+
+    def cancel(self) -> None:
+        if self.draft is not None:
+            self.draft.future.cancel()
+            self.draft = None
+
+    def take(self, day: int) -> TalkDraft | None:
+        draft = self.draft
+        self.draft = None
+        if draft is None:
+            return None
+
+        if draft.day != day:
+            draft.future.cancel()
+            return None
+
+        try:
+            # an unfinished draft gets only a short wait; the rest of the budget is left
+            # for generating the comment from scratch
+            draft.future.result(timeout=self.wait)
+        except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+            draft.future.cancel()
+            return None
+        except Exception:  # noqa: BLE001
+            return None
+        return draft
+
+    @staticmethod
+    def new_talks(draft: TalkDraft, talks: list[Talk]) -> list[Talk]:
+        seen = {talk.key for talk in draft.talks}
+        return [talk for talk in talks if talk.key not in seen]
+
+    @staticmethod
+    def is_kept(answer: str) -> bool:
+        return answer.strip().strip("「」\"'.。").upper() == TalkSpeculator.keep